@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#
+# solve() speed of the model classes in tetris.py on the same positions,
+# or with --startup the import time of the modules and how long a worker
+# pool of training workers takes to come up under fork and spawn.
+#
+# --suite times the hot paths of every backend on fixed boards: collided(),
+# solve(), the evaluation of one placement (score_at), save() and
+# try_melt(), then the whole per-piece cycle of verify() and
+# train.run_game_for_training() with fixed weights and seed. --json saves
+# the results, --compare checks them against a saved baseline and exits 1
+# if anything got slower by more than the threshold. Every benchmark keeps
+# its best of --passes runs of the whole suite. It needs nothing but the
+# standard library, so it runs the same under CPython and PyPy; what a
+# backend or train.py cannot import under the interpreter is skipped.
+#
+#   python3 benchmark.py [-p pieces] [-s seed]
+#   python3 benchmark.py --startup [-w workers]
+#   python3 benchmark.py --suite [--json out.json] [--compare base.json] [--threshold 0.1]
+#                        [--passes 3]
+#
+
+import os
+import sys
+import copy
+import json
+import time
+import random
+import getopt
+import platform
+import subprocess
+import multiprocessing
+
+from tetris_core import (TetrisModel, TetrisRandom, BACKENDS, DELLACHERIE,
+                         GRID_WIDTH, GRID_HEIGHT)
+
+NOISE_FLOOR = 0.5  # us, --compare never flags results this small as regressions
+
+
+def record_positions(pieces, seed):
+    """ play a game with TetrisModel, keep (grid, tetris_idx) before each move """
+    m = TetrisModel(GRID_WIDTH, GRID_HEIGHT, TetrisRandom(seed))
+    positions = []
+    while m.in_game and len(positions) < pieces:
+        m.new_tetris()
+        positions.append(([*m.grid], m.tetris_idx))
+        answer = m.solve()
+        m.moveX = answer[1]
+        m.moveY = answer[2]
+        m.shape_idx = answer[3]
+        m.save()
+        m.try_melt()
+    return positions
+
+
+def bench_solve(model_class, positions):
+    """ seconds spent in solve() over all positions, and the answers """
+    m = model_class(GRID_WIDTH, GRID_HEIGHT)
+    answers = []
+    elapsed = 0
+    for grid, idx in positions:
+        m.grid = [*grid]
+        m.tetris_idx = idx
+        start = time.perf_counter()
+        answer = m.solve()
+        elapsed += time.perf_counter() - start
+        answers.append(tuple(answer[:4]))
+    return elapsed, answers
+
+
+def import_time(module):
+    """ seconds a fresh interpreter spends importing module, None if it fails """
+    code = ("import time; start = time.perf_counter(); import {}; "
+            "print(time.perf_counter() - start)".format(module))
+    p = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                       cwd=os.path.dirname(os.path.abspath(__file__)))
+    if p.returncode != 0:
+        return None
+    return float(p.stdout)
+
+
+def warm_worker(_):
+    """ what a training worker does before its first game: import train
+    (under spawn that loads numpy and the rest again) and build its model,
+    only the model when train.py cannot be imported """
+    try:
+        import train
+    except ImportError:
+        TetrisModel(GRID_WIDTH, GRID_HEIGHT)
+        return os.getpid()
+    train.new_trainable_model(train.np.array(DELLACHERIE))
+    return os.getpid()
+
+
+def pool_startup(method, workers):
+    """ seconds from creating a pool until all its workers answered, with
+    train imported in this process first like in a training run """
+    try:
+        import train  # noqa: F401
+    except ImportError:
+        pass
+    context = multiprocessing.get_context(method)
+    start = time.perf_counter()
+    with context.Pool(workers) as pool:
+        pool.map(warm_worker, range(workers), chunksize=1)
+        return time.perf_counter() - start
+
+
+def startup(workers, rounds=3):
+    for module in ("tetris_core", "tetris", "tetris_gui", "train"):
+        elapsed = import_time(module)
+        if elapsed is None:
+            print("import {:<12} unavailable".format(module))
+        else:
+            print("import {:<12} {:8.1f} ms".format(module, elapsed * 1e3))
+    for method in ("fork", "spawn"):
+        if method not in multiprocessing.get_all_start_methods():
+            print("pool   {:<12} unavailable".format(method))
+            continue
+        elapsed = min(pool_startup(method, workers) for _ in range(rounds))
+        print("pool   {:<12} {:8.1f} ms for {} workers, {:.1f} ms per worker".format(
+            method, elapsed * 1e3, workers, elapsed / workers * 1e3))
+
+
+def rubble(rng, rows, fill):
+    """ rows rows of random cells at the bottom, none of them full """
+    full = (1 << GRID_WIDTH) - 1
+    grid = [0] * (GRID_HEIGHT - rows)
+    for _ in range(rows):
+        row = 0
+        for x in range(GRID_WIDTH):
+            if rng.random() < fill:
+                row |= 1 << x
+        if row == full:
+            row &= ~(1 << rng.randrange(GRID_WIDTH))
+        grid.append(row)
+    return grid
+
+
+def fixtures():
+    """ fixed (grid, tetris_idx) boards, built from their own random.Random
+    so they stay the same whatever the solver does """
+    rng = random.Random(2024)
+    return {
+        "empty": ([0] * GRID_HEIGHT, 1),
+        "mid-game": (rubble(rng, 8, 0.7), 3),
+        "tall-stack": (rubble(rng, 16, 0.8), 0),
+        "many-holes": (rubble(rng, 12, 0.5), 6),
+    }
+
+
+def per_call(fn, min_time=0.05, rounds=3):
+    """ seconds per call of fn, the best of rounds rounds that each last
+    at least min_time; the first round also warms up a JIT """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 2
+    best = elapsed / number
+    for _ in range(rounds - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def per_fresh_call(prepare, action, batch=256, min_time=0.05, rounds=3):
+    """ seconds per call of action(state) for calls that change their
+    state: each round prepares batches of states with prepare() and times
+    only the loop over them, the best of rounds rounds is returned """
+    best = None
+    for _ in range(rounds):
+        elapsed = 0.0
+        calls = 0
+        while elapsed < min_time:
+            states = [prepare() for _ in range(batch)]
+            start = time.perf_counter()
+            for state in states:
+                action(state)
+            elapsed += time.perf_counter() - start
+            calls += batch
+        if best is None or elapsed / calls < best:
+            best = elapsed / calls
+    return best
+
+
+def hot_paths(model_class, grid, idx, rounds):
+    """ microseconds of each hot function of model_class on one board """
+    m = model_class(GRID_WIDTH, GRID_HEIGHT)
+    m.grid = [*grid]
+    m.tetris_idx = idx
+    placements = [(x, y, num) for _, x, y, num in m.moves()]
+    x, y, num = placements[len(placements) // 2]
+
+    def collided():
+        for px, py, pnum in placements:
+            m.collided(px, py, pnum)
+
+    def score_at():
+        for px, py, pnum in placements:
+            m.score_at(px, py, pnum)
+
+    def prepared(rows):
+        """ a copy of m on its own copy of rows, ready for save() """
+        c = copy.copy(m)
+        c.grid = [*rows]
+        if getattr(c, "stale", False):
+            # after solve() the incremental model has the terms of the board
+            c.rebuild_features()
+        c.in_game = True
+        c.moveX, c.moveY, c.shape_idx = x, y, num
+        return c
+
+    # the same board with its two lowest rows filled up, for try_melt()
+    full = (1 << GRID_WIDTH) - 1
+    melting = [*grid[:-2], full, full]
+
+    results = {
+        "collided": per_call(collided, rounds=rounds) / len(placements),
+        "solve": per_call(m.solve, rounds=rounds),
+        "score_at": per_call(score_at, rounds=rounds) / len(placements),
+        # both change the board, every call gets a fresh copy made outside the timing
+        "save": per_fresh_call(lambda: prepared(grid), lambda c: c.save(), rounds=rounds),
+        "try_melt": per_fresh_call(lambda: prepared(melting), lambda c: c.try_melt(),
+                                   rounds=rounds),
+    }
+    return {k: v * 1e6 for k, v in results.items()}
+
+
+def verify_cycle(model_class, pieces, seed):
+    """ microseconds per piece of the new_tetris, solve, save, try_melt
+    cycle of verify(), over a game of TetrisRandom(seed) """
+    m = model_class(GRID_WIDTH, GRID_HEIGHT, TetrisRandom(seed))
+    placed = 0
+    start = time.perf_counter()
+    while m.in_game and placed < pieces:
+        m.new_tetris()
+        answer = m.solve()
+        m.moveX = answer[1]
+        m.moveY = answer[2]
+        m.shape_idx = answer[3]
+        m.save()
+        m.try_melt()
+        placed += 1
+    return (time.perf_counter() - start) / placed * 1e6
+
+
+def training_game(backend, pieces, seed):
+    """ microseconds per piece of train.run_game_for_training() with the
+    El-Tetris weights on TetrisRandom(seed), None without numpy """
+    try:
+        import numpy as np
+        import train
+    except ImportError:
+        return None
+    train.BACKEND = backend
+    stats = {}
+    start = time.perf_counter()
+    train.run_game_for_training(np.array(DELLACHERIE), stats, TetrisRandom(seed), pieces)
+    return (time.perf_counter() - start) / stats["pieces"] * 1e6
+
+
+def suite(pieces=500, seed=0, passes=3):
+    """ {name: microseconds} of every benchmark, names like list.solve.mid-game.
+    The whole suite runs passes times and every benchmark keeps its best
+    pass, so a slow spell of the machine only spoils the passes it falls in """
+    results = {}
+    boards = fixtures()
+
+    def keep(name, us):
+        results[name] = min(us, results.get(name, us))
+
+    backends = {}
+    for name, model_class in BACKENDS.items():
+        try:
+            model_class(GRID_WIDTH, GRID_HEIGHT)
+            backends[name] = model_class
+        except Exception as e:
+            print("{:<12} skipped: {}".format(name, e))
+    for _ in range(passes):
+        for name, model_class in backends.items():
+            for board, (grid, idx) in boards.items():
+                for function, us in hot_paths(model_class, grid, idx, rounds=1).items():
+                    keep("{}.{}.{}".format(name, function, board), us)
+            keep("{}.cycle".format(name), verify_cycle(model_class, pieces, seed))
+            us = training_game(name, pieces, seed)
+            if us is not None:
+                keep("{}.training".format(name), us)
+    for k, us in results.items():
+        print("{:<36} {:10.2f} us".format(k, us))
+    return results
+
+
+def compare(results, baseline, threshold):
+    """ print every result next to the baseline, return the names that got
+    slower by more than threshold (0.1 is 10%) """
+    regressions = []
+    for k, us in results.items():
+        if k not in baseline:
+            continue
+        change = us / baseline[k] - 1 if baseline[k] else 0
+        flag = ""
+        if change > threshold and max(us, baseline[k]) > NOISE_FLOOR:
+            regressions.append(k)
+            flag = "  REGRESSION"
+        print("{:<36} {:10.2f} {:10.2f} us {:+7.1%}{}".format(k, baseline[k], us, change, flag))
+    return regressions
+
+
+def run_suite(out=None, base=None, threshold=0.1, pieces=500, seed=0, passes=3):
+    interpreter = "{} {}".format(platform.python_implementation(), platform.python_version())
+    print(interpreter)
+    results = suite(pieces, seed, passes)
+    if out:
+        with open(out, "w") as f:
+            json.dump({"python": interpreter, "pieces": pieces, "seed": seed,
+                       "passes": passes, "results": results}, f, indent=1)
+    if base:
+        with open(base) as f:
+            baseline = json.load(f)
+        print("\ncompared with {} ({}), threshold {:.0%}".format(
+            base, baseline["python"], threshold))
+        regressions = compare(results, baseline["results"], threshold)
+        print("{} regressions".format(len(regressions)))
+        return 1 if regressions else 0
+    return 0
+
+
+def main(pieces=2000, seed=0):
+    positions = record_positions(pieces, seed)
+    print("positions:", len(positions))
+    base = None
+    for name, model_class in BACKENDS.items():
+        try:
+            elapsed, answers = bench_solve(model_class, positions)
+        except Exception as e:
+            print("{:<12} skipped: {}".format(name, e))
+            continue
+        if base is None:
+            base = (elapsed, answers)
+        print("{:<12} {:8.1f} us/solve {:6.2f}x  same answers: {}".format(
+            name, elapsed / len(positions) * 1e6,
+            base[0] / elapsed, answers == base[1]))
+
+
+if __name__ == '__main__':
+    opts, args = getopt.getopt(sys.argv[1:], 'p:s:uw:',
+                               ['pieces=', 'seed=', 'startup', 'workers=',
+                                'suite', 'json=', 'compare=', 'threshold=', 'passes='])
+    pieces = 2000
+    seed = 0
+    workers = os.cpu_count()
+    out = None
+    base = None
+    threshold = 0.1
+    passes = 3
+    for opt_name, opt_value in opts:
+        if opt_name in ('-w', '--workers'):
+            workers = int(opt_value)
+        if opt_name in ('-p', '--pieces'):
+            pieces = int(opt_value)
+        if opt_name in ('-s', '--seed'):
+            seed = int(opt_value)
+        if opt_name == '--json':
+            out = opt_value
+        if opt_name == '--compare':
+            base = opt_value
+        if opt_name == '--threshold':  # 0.1 flags anything 10% slower
+            threshold = float(opt_value)
+        if opt_name == '--passes':
+            passes = int(opt_value)
+    for opt_name, opt_value in opts:
+        if opt_name == '--suite':
+            # a game per backend of -p pieces, 500 unless given
+            sys.exit(run_suite(out, base, threshold,
+                               pieces if '-p' in dict(opts) or '--pieces' in dict(opts) else 500,
+                               seed, passes))
+        if opt_name in ('-u', '--startup'):
+            startup(workers)
+            sys.exit()
+    main(pieces, seed)
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#
+# Island-model training. Several populations evolve on their own with the
+# GA of train.py, and every MIGRATE_EVERY generations each island sends its
+# best genomes to the next island of a ring. A coordinator passes the
+# migrants on and collects progress; islands connect to it over a socket
+# from any host. Islands never wait for each other: migrants that have not
+# arrived yet are picked up at the next exchange.
+#
+#   python3 islands.py --local 4 [-g generations] [-p population] [-w workers] [-o optimizer]
+#   python3 islands.py --serve [--port 50000] [--islands 4] [--authkey key]
+#   python3 islands.py --connect host:50000 --island 0 [-g generations] [-p population]
+#
+
+import sys
+import time
+import random
+import getopt
+import threading
+import multiprocessing
+from multiprocessing.managers import BaseManager
+
+import numpy as np
+
+import train
+
+PORT = 50000
+AUTHKEY = "tetris"
+MIGRATE_EVERY = 5  # generations between two exchanges
+MIGRANTS = 2  # best genomes an island sends at each exchange
+REPORT_EVERY = 10  # seconds between two progress lines of the coordinator
+
+
+class Migrations(object):
+    """ what the coordinator keeps: the migrants waiting for each island
+    and the last progress report of every island """
+
+    def __init__(self, islands):
+        self.islands = islands
+        self.waiting = [[] for _ in range(islands)]
+        self.reports = {}
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+    def size(self):
+        return self.islands
+
+    def post(self, island, genomes):
+        """ genomes (lists of floats) of island go to the next island of the ring """
+        with self.lock:
+            self.waiting[(island + 1) % self.islands] += genomes
+
+    def take(self, island):
+        """ the migrants that arrived for island since its last take() """
+        with self.lock:
+            genomes, self.waiting[island] = self.waiting[island], []
+        return genomes
+
+    def report(self, island, progress):
+        with self.lock:
+            self.reports[island] = progress
+
+    def progress(self):
+        """ the reports by island and the seconds since the coordinator started """
+        with self.lock:
+            return dict(self.reports), time.time() - self.started
+
+
+_migrations = None
+
+
+def migrations(islands=None):
+    """ the Migrations of the coordinator process, created by the first call """
+    global _migrations
+    if _migrations is None:
+        _migrations = Migrations(islands)
+    return _migrations
+
+
+class IslandManager(BaseManager):
+    pass
+
+
+IslandManager.register("migrations", callable=migrations)
+
+
+def run_island(address, island, population_size, generations, authkey, workers=None):
+    """ evolve one island, exchanging migrants through the coordinator at address """
+    manager = IslandManager(address, authkey.encode())
+    manager.connect()
+    board = manager.migrations()
+
+    # the island is a process of its own, train's settings are ours to change
+    train.POPULATION_SIZE = population_size
+    train.WORKERS = workers
+    # islands play different piece sequences from each other
+    train.SEED += island * generations * train.GAME_REPEATS
+    random.seed(train.SEED)
+    np.random.seed(train.SEED)
+
+    optimizer = train.new_optimizer()
+    evaluated = 0
+    best_ever = None  # (fitness, weights) of the best genome of any generation
+    with multiprocessing.Pool(workers) as pool:
+        for gen in range(generations):
+            start_time = time.monotonic()
+            population = optimizer.ask()
+            if gen and gen % MIGRATE_EVERY == 0:
+                # migrants take the places of the last candidates, the GA's elites stay
+                migrants = board.take(island)[:population_size // 2]
+                for k, genome in enumerate(migrants):
+                    population[-1 - k] = np.array(genome)
+
+            fitness = train.calculate_fitness_parallel(population, pool, gen)
+            evaluated += len(population)
+            order = np.argsort(-fitness, kind="stable")
+            best = population[order[0]]
+            if best_ever is None or fitness[order[0]] > best_ever[0]:
+                best_ever = (float(fitness[order[0]]), best.tolist())
+            if (gen + 1) % MIGRATE_EVERY == 0:
+                board.post(island, [population[i].tolist() for i in order[:MIGRANTS]])
+            board.report(island, {"generation": gen + 1, "genomes": evaluated,
+                                  "pieces": train.worker_totals["pieces"],
+                                  "best": best_ever[0], "weights": best_ever[1],
+                                  "done": gen + 1 == generations})
+            print("island {} generation {}/{}: {:.2f}s, best {:.2f} {}".format(
+                island, gen + 1, generations, time.monotonic() - start_time,
+                fitness[order[0]], np.round(best, 4)))
+
+            optimizer.tell(population, fitness)
+
+
+def coordinate(board, islands):
+    """ print the progress of all islands until every one of them is done,
+    then the best weights any island found in any generation """
+    while True:
+        reports, elapsed = board.progress()
+        genomes = sum(r["genomes"] for r in reports.values())
+        pieces = sum(r["pieces"] for r in reports.values())
+        best = max(reports.values(), key=lambda r: r["best"], default=None)
+        print("[{:.0f}s] islands {}/{}, genomes {} ({:.0f}/h), pieces {} ({:.0f}/s){}".format(
+            elapsed, len(reports), islands, genomes, genomes / elapsed * 3600,
+            pieces, pieces / elapsed, "" if best is None else ", best {:.2f}".format(best["best"])))
+        if len(reports) == islands and all(r["done"] for r in reports.values()):
+            break
+        time.sleep(REPORT_EVERY)
+    print("Final best weights found: {}".format(best["weights"]))
+    weights = ",".join(repr(w) for w in best["weights"])
+    print("Play them with: python3 tetris.py -a --weights={}".format(weights))
+
+
+def serve(host, port, islands, authkey):
+    """ run the coordinator until all islands connecting to host:port are done """
+    manager = IslandManager((host, port), authkey.encode())
+    manager.start(migrations, (islands,))
+    print("coordinator for {} islands at {}:{}".format(islands, *manager.address))
+    try:
+        coordinate(manager.migrations(), islands)
+    finally:
+        manager.shutdown()
+
+
+def local(islands, population_size, generations, authkey, workers):
+    """ coordinator and islands as processes of this machine """
+    manager = IslandManager(("127.0.0.1", 0), authkey.encode())
+    manager.start(migrations, (islands,))
+    processes = [multiprocessing.Process(
+        target=run_island,
+        args=(manager.address, i, population_size, generations, authkey, workers))
+        for i in range(islands)]
+    try:
+        for p in processes:
+            p.start()
+        coordinate(manager.migrations(), islands)
+        for p in processes:
+            p.join()
+    finally:
+        for p in processes:
+            if p.is_alive():
+                p.terminate()
+        manager.shutdown()
+
+
+if __name__ == '__main__':
+    try:
+        multiprocessing.set_start_method("fork", force=True)
+    except RuntimeError:
+        pass
+
+    opts, args = getopt.getopt(
+        sys.argv[1:], 'g:p:w:o:',
+        ['local=', 'serve', 'connect=', 'island=', 'islands=', 'host=', 'port=',
+         'authkey=', 'generations=', 'population=', 'workers=', 'optimizer='])
+    islands = 4
+    island = 0
+    host = ""
+    port = PORT
+    authkey = AUTHKEY
+    generations = train.NUM_GENERATIONS
+    population_size = train.POPULATION_SIZE
+    workers = None
+    for opt_name, opt_value in opts:
+        if opt_name in ('--local', '--islands'):
+            islands = int(opt_value)
+        if opt_name == '--island':
+            island = int(opt_value)
+        if opt_name == '--host':
+            host = opt_value
+        if opt_name == '--port':
+            port = int(opt_value)
+        if opt_name == '--authkey':
+            authkey = opt_value
+        if opt_name in ('-g', '--generations'):
+            generations = int(opt_value)
+        if opt_name in ('-p', '--population'):
+            population_size = int(opt_value)
+        if opt_name in ('-w', '--workers'):
+            workers = int(opt_value)
+        if opt_name in ('-o', '--optimizer'):
+            if opt_value not in train.OPTIMIZERS:
+                raise(Exception("unknown optimizer {}, choose from {}".format(
+                    opt_value, ", ".join(train.OPTIMIZERS))))
+            train.OPTIMIZER = opt_value
+    for opt_name, opt_value in opts:
+        if opt_name == '--local':
+            # share the cores of this machine between the islands
+            if workers is None:
+                workers = max(1, multiprocessing.cpu_count() // islands)
+            local(islands, population_size, generations, authkey, workers)
+            sys.exit()
+        if opt_name == '--serve':
+            serve(host, port, islands, authkey)
+            sys.exit()
+        if opt_name == '--connect':
+            host, port = opt_value.rsplit(":", 1)
+            run_island((host, int(port)), island, population_size, generations,
+                       authkey, workers)
+            sys.exit()
+    print("usage: islands.py --local N | --serve | --connect host:port --island I")
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#
+# Headless engine playing many independent games in lockstep.
+#
+#   python3 lockstep.py [-g games] [-l limit]
+#
+
+import sys
+import time
+import getopt
+
+import numpy as np
+
+from tetris_core import (NumpyTetrisModel, TetrisRandom, DELLACHERIE,
+                         GRID_WIDTH, GRID_HEIGHT)
+
+
+class LockstepGames(object):
+    """ N games advanced one piece at a time, all of them together.
+
+    The state is kept as arrays over the games: boards (N, height) of row
+    ints, tops (N, width) skylines, current / next pieces, an alive mask
+    and the lines and pieces counters. Every step places one piece in
+    every live game: the candidates of all games holding the same piece
+    are scored in one numpy batch, then the chosen boards are melted
+    together. A game that is over or reached the piece limit drops out
+    of the alive mask and costs nothing afterwards.
+
+    weights has one row of 6 El-Tetris weights per game. randoms are the
+    piece generators, one per game, anything with a next() method.
+    """
+
+    def __init__(self, weights, randoms=None, w=GRID_WIDTH, h=GRID_HEIGHT, limit=None):
+        self.weights = np.array(weights, dtype=float).reshape(-1, 6)
+        n = len(self.weights)
+        self.width = w
+        self.height = h
+        self.limit = limit
+        # the numpy model holds the candidate tables and row lookups, and
+        # scores the rare placements that do not fit at all one by one
+        self.model = NumpyTetrisModel(w, h)
+        self.randoms = randoms or [TetrisRandom() for _ in range(n)]
+        self.boards = np.zeros((n, h), dtype=self.model.dtype)
+        self.tops = np.full((n, w), h)
+        self.alive = np.ones(n, dtype=bool)
+        self.lines = np.zeros(n, dtype=np.int64)
+        self.pieces = np.zeros(n, dtype=np.int64)
+        # TetrisModel plays the piece drawn in __init__ first, then the rest
+        self.current = np.array([r.next() for r in self.randoms])
+        self.next = np.array([r.next() for r in self.randoms])
+
+    def scalar(self, game, idx):
+        """ the helper model set to a game's board and piece """
+        m = self.model
+        m.grid = [int(r) for r in self.boards[game]]
+        m.tetris_idx = idx
+        return m
+
+    def step(self):
+        """ place one piece in every live game """
+        placed = np.nonzero(self.alive)[0]
+        for idx in range(len(self.model.candidates)):
+            games = placed[self.current[placed] == idx]
+            if len(games):
+                self.boards[games] = self.place(games, idx)
+
+        boards, melted = self.model.batch_melt(self.boards[placed])
+        self.boards[placed] = boards
+        self.lines[placed] += melted
+        self.pieces[placed] += 1
+        self.update(placed)
+        for g in np.nonzero(self.alive)[0]:
+            self.current[g] = self.next[g]
+            self.next[g] = self.randoms[g].next()
+
+    def update(self, games):
+        """ skylines and alive flags of games after their boards changed """
+        bits = (self.boards[games][:, :, None] >> np.arange(self.width)) & 1
+        self.tops[games] = np.where(bits.any(1), bits.argmax(1), self.height)
+        self.alive[games] = self.boards[games, 0] == 0
+        if self.limit is not None:
+            self.alive[games] &= self.pieces[games] < self.limit
+
+    def state(self, game):
+        """ where game stands, the way train.game_state() describes a
+        TetrisModel game: the last piece placed and the one to come """
+        return {"grid": [int(r) for r in self.boards[game]],
+                "tetris_idx": int(self.current[game]), "next_tetris": int(self.next[game]),
+                "in_game": bool(self.boards[game, 0] == 0),
+                "lines": int(self.lines[game]), "pieces": int(self.pieces[game]),
+                "index": getattr(self.randoms[game], "index", None)}
+
+    def resume(self, game, state):
+        """ continue game from a state() of an earlier, shorter run """
+        self.boards[game] = state["grid"]
+        self.lines[game] = state["lines"]
+        self.pieces[game] = state["pieces"]
+        self.update([game])
+        self.current[game] = state["next_tetris"]
+        if self.alive[game]:
+            if state["index"] is not None:
+                self.randoms[game].index = state["index"]
+            self.next[game] = self.randoms[game].next()
+
+    def place(self, games, idx):
+        """ best placement of piece idx in each of the games, as boards """
+        m = self.model
+        h = self.height
+        nums, xs, heights, stamps, columns, bottoms = m.candidates[idx]
+        n = len(nums)
+        g = len(games)
+
+        tops = np.concatenate([self.tops[games], np.full((g, 1), 2 * h)], 1)
+        ys = (tops[:, columns] - bottoms[None]).min(2) - 1
+        for i, j in zip(*np.nonzero(ys < 0)):
+            ys[i, j] = self.scalar(games[i], idx).scan_landing(xs[j], nums[j])
+        stuck = ys < 0
+
+        boards = np.zeros((g, n, h + 4), dtype=m.dtype)
+        boards[:, :, :h] = self.boards[games][:, None, :]
+        rows = np.where(stuck, h, ys)[:, :, None] + np.arange(4)
+        boards[np.arange(g)[:, None, None], np.arange(n)[None, :, None], rows] |= stamps[None]
+        boards = boards[:, :, :h]
+
+        features = m.batch_features(boards.reshape(g * n, h), ys.reshape(-1),
+                                    np.tile(heights, g))
+        weights = self.weights[games]
+        scores = weights[:, 0, None] * features[0].reshape(g, n)
+        for k in range(1, 6):
+            scores = scores + weights[:, k, None] * features[k].reshape(g, n)
+        for i, j in zip(*np.nonzero(stuck)):
+            scratch = self.scalar(games[i], idx)
+            diag = scratch.evaluate(scratch.place(xs[j], -1, nums[j]), xs[j], -1, nums[j])[4]
+            scores[i, j] = sum(weights[i, k] * diag[3 + k] for k in range(6))
+
+        best = scores.argmax(1)
+        chosen = boards[np.arange(g), best]
+        for i in np.nonzero(stuck[np.arange(g), best])[0]:
+            # the piece is put at row 0 like train.run_game_for_training()
+            # does, row -1 would wrap its top row into the bottom of the board
+            j = best[i]
+            chosen[i] = self.scalar(games[i], idx).place(xs[j], 0, nums[j])
+        return chosen
+
+    def run(self):
+        """ play until every game is over, returns the lines cleared """
+        while self.alive.any():
+            self.step()
+        return self.lines
+
+
+def main(games=64, limit=2000):
+    start = time.perf_counter()
+    sim = LockstepGames([DELLACHERIE] * games, limit=limit)
+    sim.run()
+    elapsed = time.perf_counter() - start
+    total = int(sim.pieces.sum())
+    print("games: {} pieces: {} lines: mean {:.1f} min {} max {}".format(
+        games, total, sim.lines.mean(), sim.lines.min(), sim.lines.max()))
+    print("{:.2f}s, {:.0f} pieces/s".format(elapsed, total / elapsed))
+
+
+if __name__ == '__main__':
+    opts, args = getopt.getopt(sys.argv[1:], 'g:l:', ['games=', 'limit='])
+    games = 64
+    limit = 2000
+    for opt_name, opt_value in opts:
+        if opt_name in ('-g', '--games'):
+            games = int(opt_value)
+        if opt_name in ('-l', '--limit'):
+            limit = int(opt_value)
+    main(games, limit)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#
+# Replays fixed boards through every evaluator backend in tetris_core.BACKENDS
+# and checks each placement scores exactly as the per-cell reference does.
+#
+#   python3 parity.py [-n boards] [-s seed]
+#
+
+import sys
+import random
+import getopt
+
+from tetris_core import BACKENDS, DELLACHERIE, GRID_WIDTH, GRID_HEIGHT
+from benchmark import record_positions
+
+
+def reference(grid, width, height):
+    """ melted, RowTransitions, ColumnTransitions, NumberOfHoles, WellSums
+    the way the original per-cell evaluate() counted them """
+    grid = [*grid]
+    RowTransitions = 0
+    ColumnTransitions = 0
+    NumberOfHoles = 0
+    WellSums = 0
+
+    melted = 0
+    h = height - 1
+    while h > 0:
+        if 1 << width <= grid[h] + 1:
+            melted += 1
+            for y in range(h, 0, -1):
+                grid[y] = grid[y - 1]
+            h += 1
+        h -= 1
+
+    for y in range(height):
+        last_cell = 1
+        for x in range(width):
+            cell = (grid[y] >> x) & 1
+            if last_cell != cell:
+                RowTransitions += 1
+            last_cell = cell
+        if cell == 0:
+            RowTransitions += 1
+
+    for x in range(width):
+        mark = 0
+        col_cells = 0
+        wells = 0
+        last_cell = 0
+        for y in range(height):
+            cell = (grid[y] >> x) & 1
+            if last_cell != cell:
+                ColumnTransitions += 1
+            last_cell = cell
+            left = (grid[y] >> x - 1 & 1) if x > 0 else 1
+            right = (grid[y] >> x + 1 & 1) if x < width - 1 else 1
+            if cell == 0 and left == 1 and right == 1:
+                wells += 1
+            elif wells > 0:
+                WellSums += (1 + wells) * wells // 2
+                wells = 0
+            if y >= height - 1:
+                WellSums += (1 + wells) * wells // 2
+                wells = 0
+            if cell == 1:
+                col_cells += 1
+                if mark == 0:
+                    mark = y
+        if col_cells > 0:
+            NumberOfHoles += height - mark - col_cells
+        if last_cell == 0:
+            ColumnTransitions += 1
+    return melted, RowTransitions, ColumnTransitions, NumberOfHoles, WellSums
+
+
+def fixed_boards(count, seed):
+    """ count (grid, tetris_idx) pairs: random rubble, half of them
+    with a few cells at row 0, then positions of a played game """
+    rng = random.Random(seed)
+    full = (1 << GRID_WIDTH) - 1
+    boards = []
+    for i in range(count // 2):
+        top = rng.randint(1, GRID_HEIGHT)
+        grid = [0] * top
+        for y in range(top, GRID_HEIGHT):
+            # some rows come full, to be melted by the evaluation
+            grid.append(full if rng.random() < 0.15 else rng.getrandbits(GRID_WIDTH))
+        if i % 2:
+            grid[0] = rng.getrandbits(GRID_WIDTH) & (full >> 1)
+        boards.append((grid, rng.randrange(7)))
+    return boards + record_positions(count - len(boards), seed)
+
+
+def check(model, grid, idx, weights):
+    """ placements where model disagrees with the reference, as strings """
+    width, height = model.width, model.height
+    model.grid = [*grid]
+    model.tetris_idx = idx
+    model.weights = weights
+    errors = []
+    for score, x, y, num in model.moves():
+        placed = model.place(x, y, num)
+        if placed[0] == (1 << width) - 1:
+            continue  # the per-cell melting never ends on a full row 0
+        s = model.pieces[idx][num]
+        LandingHeight = 20 - (y + s.height) + (s.height-1)/2
+        melted, RowTransitions, ColumnTransitions, NumberOfHoles, WellSums = \
+            reference(placed, width, height)
+        expected = (weights[0] * LandingHeight +
+                    weights[1] * melted +
+                    weights[2] * RowTransitions +
+                    weights[3] * ColumnTransitions +
+                    weights[4] * NumberOfHoles +
+                    weights[5] * WellSums)
+        if score != expected:
+            errors.append("{} piece {} at {}: {} != {}".format(
+                grid, idx, (x, y, num), score, expected))
+    return errors
+
+
+def main(count=200, seed=0):
+    rng = random.Random(seed)
+    weight_sets = [DELLACHERIE] + [tuple(rng.uniform(-10, 10) for _ in range(6))
+                                   for _ in range(3)]
+    boards = fixed_boards(count, seed)
+    print("boards:", len(boards), "weights:", len(weight_sets))
+    failed = False
+    answers = None
+    for name, model_class in BACKENDS.items():
+        try:
+            model = model_class(GRID_WIDTH, GRID_HEIGHT)
+        except Exception as e:
+            print("{:<12} skipped: {}".format(name, e))
+            continue
+        model.check = True
+        errors = []
+        solved = []
+        for grid, idx in boards:
+            for weights in weight_sets:
+                errors += check(model, grid, idx, weights)
+                solved.append(tuple(model.solve()))
+        if answers is None:
+            answers = solved
+        same = solved == answers
+        print("{:<12} mismatches: {}  same answers: {}".format(name, len(errors), same))
+        for e in errors[:3]:
+            print("   ", e)
+        failed = failed or bool(errors) or not same
+    return failed
+
+
+if __name__ == '__main__':
+    opts, args = getopt.getopt(sys.argv[1:], 'n:s:', ['boards=', 'seed='])
+    count = 200
+    seed = 0
+    for opt_name, opt_value in opts:
+        if opt_name in ('-n', '--boards'):
+            count = int(opt_value)
+        if opt_name in ('-s', '--seed'):
+            seed = int(opt_value)
+    sys.exit(1 if main(count, seed) else 0)
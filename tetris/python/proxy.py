@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#
+# How well a proxy environment of train.py ranks genomes: plays the same
+# genomes in the proxy and on the full board, prints the Spearman rank
+# correlation of the two scores, how many of the best genomes the proxy
+# stage would have kept, and what each evaluation cost.
+#
+#   python3 proxy.py [-n genomes] [-l limit] [-s seed]
+#                    [--width 8] [--height 16] [--sz 0.4] [--garbage 4]
+#
+
+import sys
+import math
+import time
+import getopt
+import multiprocessing
+
+import numpy as np
+
+import train
+from tetris_core import DELLACHERIE
+
+
+def ranks(scores):
+    """ ranks from 1, tied scores share the mean of their ranks """
+    scores = np.asarray(scores, dtype=float)
+    order = np.argsort(scores, kind="stable")
+    r = np.empty(len(scores))
+    r[order] = np.arange(1, len(scores) + 1)
+    for value in np.unique(scores):
+        tied = scores == value
+        r[tied] = r[tied].mean()
+    return r
+
+
+def spearman(a, b):
+    """ Spearman's rank correlation of a and b, nan if either is constant """
+    ra, rb = ranks(a), ranks(b)
+    ra -= ra.mean()
+    rb -= rb.mean()
+    norm = math.sqrt((ra ** 2).sum() * (rb ** 2).sum())
+    return float((ra * rb).sum() / norm) if norm else float("nan")
+
+
+def genomes(count, seed):
+    """ half random genomes as in a first generation, half around El-Tetris,
+    so there are both weak and strong players to rank """
+    rng = np.random.default_rng(seed)
+    population = [rng.uniform(-1.0, 1.0, train.NUM_WEIGHTS) for _ in range(count // 2)]
+    population += [np.array(DELLACHERIE) * rng.normal(1.0, 0.5, train.NUM_WEIGHTS)
+                   for _ in range(count - len(population))]
+    return population
+
+
+def timed(evaluate):
+    """ scores, seconds and pieces of one evaluation """
+    pieces = train.worker_totals["pieces"]
+    start = time.perf_counter()
+    scores = evaluate()
+    return scores, time.perf_counter() - start, train.worker_totals["pieces"] - pieces
+
+
+def main(count, proxy, seed=0):
+    population = genomes(count, seed)
+    with multiprocessing.Pool(train.WORKERS) as pool:
+        full, full_seconds, full_pieces = timed(lambda: train.calculate_fitness_parallel(
+            population, pool, racing=False, proxy=False))
+        cheap, proxy_seconds, proxy_pieces = timed(lambda: train.proxy_fitness(
+            population, pool, proxy=proxy))
+    print("genomes: {}, proxy: {}".format(count, proxy))
+    print("full  {:8.1f}s {:10} pieces, mean {:.1f} lines".format(
+        full_seconds, full_pieces, full.mean()))
+    print("proxy {:8.1f}s {:10} pieces, mean {:.1f} lines, {:.1f}x cheaper".format(
+        proxy_seconds, proxy_pieces, cheap.mean(), full_pieces / max(proxy_pieces, 1)))
+    print("spearman: {:.3f}".format(spearman(cheap, full)))
+    keep = math.ceil(count * train.PROXY_KEEP)
+    best = set(np.argsort(-full, kind="stable")[:keep])
+    kept = set(np.argsort(-cheap, kind="stable")[:keep])
+    print("best {} on the full board kept by the proxy stage: {}".format(
+        keep, len(best & kept)))
+
+
+if __name__ == '__main__':
+    try:
+        multiprocessing.set_start_method("fork", force=True)
+    except RuntimeError:
+        pass
+
+    opts, args = getopt.getopt(sys.argv[1:], 'n:l:s:',
+                               ['genomes=', 'limit=', 'seed=',
+                                'width=', 'height=', 'sz=', 'garbage='])
+    count = 64
+    seed = 0
+    proxy = {}
+    for opt_name, opt_value in opts:
+        if opt_name in ('-n', '--genomes'):
+            count = int(opt_value)
+        if opt_name in ('-l', '--limit'):
+            train.GAME_LIMIT = int(opt_value)
+        if opt_name in ('-s', '--seed'):
+            seed = int(opt_value)
+            train.SEED = seed
+        if opt_name in ('--width', '--height', '--garbage'):
+            proxy[opt_name[2:]] = int(opt_value)
+        if opt_name == '--sz':
+            proxy["sz"] = float(opt_value)
+    main(count, proxy or train.PROXY or {"width": 8, "height": 16}, seed)
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#
+# Hyperparameter sweep of the GA in train.py. Every configuration is a run
+# of its own, and all runs play their games on one shared worker pool. The
+# next game always goes to the run that has simulated the fewest pieces so
+# far, so no run can crowd out the others. Every STOP_EVERY generations, a
+# run whose best fitness is below the median of the runs that got as far is
+# stopped. A run waits there until enough runs got as far, so the cheap runs
+# of weak configurations cannot finish before they are compared. At the end
+# the runs are listed by best fitness, together with the pieces they
+# simulated.
+#
+#   python3 sweep.py [-g generations] [-w workers] [-s seed] [-r samples]
+#                    [-o results.jsonl] NAME=v1,v2,... [NAME=v1,v2,...]
+#
+#   e.g. python3 sweep.py -g 20 MUTATION_RATE=0.1,0.25 POPULATION_SIZE=32,64 GAME_LIMIT=2000
+#
+# Without -r every combination of the values is run, with -r that many of
+# them are sampled at random.
+#
+
+import os
+import sys
+import json
+import queue
+import random
+import getopt
+import itertools
+import multiprocessing
+from contextlib import contextmanager
+
+import numpy as np
+
+import train
+
+SWEEPABLE = ("POPULATION_SIZE", "MUTATION_RATE", "CROSSOVER_RATE", "ELITISM_PERCENT",
+             "GAME_LIMIT", "GAME_REPEATS")
+STOP_AFTER = 5  # generations a run plays before it can be stopped
+STOP_EVERY = 5  # generations between two early stopping checks
+STOP_PEERS = 3  # runs that must have got as far before the median means anything
+
+
+class SweepRun(object):
+    """ One configuration of the GA, advanced one game at a time by the
+    scheduler. train's module settings and both random generators are
+    switched to this run's while its own code runs, so each run evolves
+    as if it had been started alone with its seed. """
+
+    def __init__(self, number, config, generations, seed):
+        self.number = number
+        self.config = config
+        self.generations = generations
+        self.random_state = random.Random(seed).getstate()
+        self.np_random_state = np.random.RandomState(seed).get_state()
+        self.generation = 0
+        self.pieces = 0
+        self.playing = 0  # games handed to the pool and not back yet
+        self.pending = []  # (game, genome) still to hand out in this generation
+        self.best = None
+        self.best_weights = None
+        self.curve = []  # (pieces, best fitness so far) after every generation
+        self.status = "running"
+        self.held = False  # waiting at a checkpoint for early_stop()
+        self.bank = None
+        with self.configured():
+            self.population = train.initialize_population()
+        self.start_generation()
+
+    @contextmanager
+    def configured(self):
+        saved = {k: getattr(train, k) for k in self.config}
+        outer = random.getstate(), np.random.get_state()
+        for k, v in self.config.items():
+            setattr(train, k, v)
+        random.setstate(self.random_state)
+        np.random.set_state(self.np_random_state)
+        try:
+            yield
+        finally:
+            self.random_state = random.getstate()
+            self.np_random_state = np.random.get_state()
+            random.setstate(outer[0])
+            np.random.set_state(outer[1])
+            for k, v in saved.items():
+                setattr(train, k, v)
+
+    def start_generation(self):
+        with self.configured():
+            seed = None
+            if train.COMMON_RANDOM_NUMBERS:
+                seed = train.generation_seed(self.generation)
+                self.bank = train.new_bank(seed)
+            self.limit = train.GAME_LIMIT
+            self.scores = np.zeros((train.GAME_REPEATS, len(self.population)))
+        self.pending = [(game, i) for game in range(len(self.scores))
+                        for i in range(len(self.population))]
+        self.left = len(self.pending)
+
+    def next_task(self):
+        """ the play_task() of the next game, its group tells the run apart """
+        game, i = self.pending.pop()
+        self.playing += 1
+        return (game, [(self.number, i)], [self.population[i]], [None], self.bank,
+                self.limit, False, None)
+
+    def collect(self, game, i, lines, pieces):
+        self.playing -= 1
+        self.pieces += pieces
+        if self.status != "running":
+            self.release()
+            return False
+        self.scores[game, i] = lines
+        self.left -= 1
+        if self.left:
+            return False
+        self.finish_generation()
+        return True
+
+    def finish_generation(self):
+        self.release()
+        fitness = self.scores.mean(axis=0)
+        best = int(np.argmax(fitness))
+        if self.best is None or fitness[best] > self.best:
+            self.best = float(fitness[best])
+            self.best_weights = self.population[best].tolist()
+        self.curve.append((self.pieces, self.best))
+        self.generation += 1
+        with self.configured():
+            self.population = train.selection(self.population, fitness)
+        if checkpoint(self.generation):
+            self.held = True
+        else:
+            self.go_on()
+
+    def go_on(self):
+        """ the next generation, or done """
+        self.held = False
+        if self.generation >= self.generations:
+            self.status = "done"
+        else:
+            self.start_generation()
+
+    def stop(self):
+        self.status = "stopped at {}".format(self.generation)
+        self.pending = []
+        self.release()
+
+    def release(self):
+        """ remove the piece bank once no game of the pool reads it any more """
+        if self.bank is not None and (self.status == "running" and not self.left or
+                                      self.status != "running" and not self.playing):
+            os.remove(self.bank)
+            self.bank = None
+
+
+def checkpoint(generation):
+    """ whether early_stop() compares the runs at generation """
+    return generation >= STOP_AFTER and (generation - STOP_AFTER) % STOP_EVERY == 0
+
+
+def early_stop(runs):
+    """ the median stopping rule: at STOP_AFTER generations, and then every
+    STOP_EVERY, a run whose best is below the median best of the runs that
+    got as far is stopped. A run reaching a checkpoint is held there until
+    STOP_PEERS runs got as far, or no more of them can, and runs are
+    checked again as more of them arrive. The best is taken per piece of
+    GAME_LIMIT, so that runs with different limits compare fairly. """
+    def score(run, g):
+        return run.curve[g - 1][1] / run.config.get("GAME_LIMIT", train.GAME_LIMIT)
+
+    changed = True
+    while changed:
+        changed = False
+        for run in runs:
+            if run.status != "running" or run.generation < STOP_AFTER:
+                continue
+            g = run.generation - (run.generation - STOP_AFTER) % STOP_EVERY
+            peers = [score(r, g) for r in runs if len(r.curve) >= g]
+            coming = sum(1 for r in runs if r.status == "running" and len(r.curve) < g)
+            if len(peers) >= STOP_PEERS and score(run, g) < np.median(peers):
+                run.stop()
+                print("run {:>3} stopped after {} generations".format(run.number, run.generation))
+                changed = True
+            elif run.held and (len(peers) >= STOP_PEERS or len(peers) + coming < STOP_PEERS):
+                run.go_on()
+                changed = True
+
+
+def sweep(configs, generations, workers=None, seed=0):
+    """ run every configuration for generations generations on one pool """
+    runs = [SweepRun(n, config, generations, seed + n) for n, config in enumerate(configs)]
+    slots = 2 * (workers or os.cpu_count())
+    done = queue.Queue()
+    in_flight = 0
+    with multiprocessing.Pool(workers) as pool:
+        while True:
+            # fair share: the next game goes to the run with the fewest pieces so far
+            while in_flight < slots:
+                ready = [r for r in runs if r.pending]
+                if not ready:
+                    break
+                run = min(ready, key=lambda r: (r.pieces, r.number))
+                pool.apply_async(train.play_task, (run.next_task(),),
+                                 callback=done.put, error_callback=done.put)
+                in_flight += 1
+            if not in_flight:
+                break
+            result = done.get()
+            in_flight -= 1
+            if isinstance(result, Exception):
+                raise result
+            game, ((number, i),), (lines,), stats = result
+            run = runs[number]
+            pieces = stats["pieces"]
+            stats.pop("states")
+            train.add_worker_stats(stats)
+            if run.collect(game, i, lines, pieces):
+                print("run {:>3} generation {:>3}: best {:8.2f}, {} pieces".format(
+                    number, run.generation, run.best, run.pieces))
+                early_stop(runs)
+    return runs
+
+
+def report(runs, names):
+    header = ["run"] + list(names) + ["gens", "pieces", "best", "status"]
+    rows = []
+    for run in sorted(runs, key=lambda r: -(r.best or 0)):
+        rows.append([str(run.number)] + [str(run.config[k]) for k in names] +
+                    [str(run.generation), str(run.pieces),
+                     "{:.2f}".format(run.best or 0), run.status])
+    widths = [max(len(row[c]) for row in [header] + rows) for c in range(len(header))]
+    for row in [header] + rows:
+        print("  ".join(cell.rjust(w) for cell, w in zip(row, widths)))
+
+
+def parse(specs):
+    """ {NAME: [values]} from NAME=v1,v2,... arguments """
+    grid = {}
+    for spec in specs:
+        name, _, values = spec.partition("=")
+        if name not in SWEEPABLE:
+            raise(Exception("cannot sweep {}, choose from {}".format(name, ", ".join(SWEEPABLE))))
+        grid[name] = [int(v) if isinstance(getattr(train, name), int) else float(v)
+                      for v in values.split(",")]
+    return grid
+
+
+if __name__ == '__main__':
+    try:
+        multiprocessing.set_start_method("fork", force=True)
+    except RuntimeError:
+        pass
+
+    opts, args = getopt.getopt(sys.argv[1:], 'g:w:s:r:o:',
+                               ['generations=', 'workers=', 'seed=', 'random=', 'out='])
+    generations = train.NUM_GENERATIONS
+    workers = None
+    seed = 0
+    samples = None
+    out = None
+    for opt_name, opt_value in opts:
+        if opt_name in ('-g', '--generations'):
+            generations = int(opt_value)
+        if opt_name in ('-w', '--workers'):
+            workers = int(opt_value)
+        if opt_name in ('-s', '--seed'):
+            seed = int(opt_value)
+        if opt_name in ('-r', '--random'):
+            samples = int(opt_value)
+        if opt_name in ('-o', '--out'):
+            out = opt_value
+    grid = parse(args)
+    names = list(grid)
+    configs = [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+    if samples is not None and samples < len(configs):
+        configs = random.Random(seed).sample(configs, samples)
+    print("{} configurations, {} generations each".format(len(configs), generations))
+    runs = sweep(configs, generations, workers, seed)
+    report(runs, names)
+    if out:
+        with open(out, "w") as f:
+            for run in runs:
+                f.write(json.dumps({"config": run.config, "status": run.status,
+                                    "generations": run.generation, "pieces": run.pieces,
+                                    "best": run.best, "best_weights": run.best_weights,
+                                    "curve": run.curve}) + "\n")
@@ -0,0 +1,1438 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#
+# The game without the window: piece tables, the randomizer, the models
+# and the headless verify() mode. Nothing here needs tkinter, training
+# workers and boxes without Tk import this instead of tetris.py.
+#
+# to gain maximum speed, try pypy3.
+#
+
+import math
+import copy
+import time
+import random
+from collections import OrderedDict
+from datetime import datetime
+from enum import Enum
+
+# what `from tetris_core import *` (tetris.py) exports: the game, not the
+# modules imported here or the numpy placeholder
+__all__ = ["GRID_WIDTH", "GRID_HEIGHT", "DELLACHERIE", "T", "Rotation", "piece_tables",
+           "PIECES", "feature_tables", "well_sum", "Direction", "TetrisRandom",
+           "WeightedRandom", "SequenceRandom", "PieceBank", "SolveCache", "PhaseProfile",
+           "TetrisModel", "IncrementalTetrisModel", "BitboardTetrisModel", "NumpyTetrisModel",
+           "BACKENDS", "new_model", "verify", "play_seeded_game", "verify_games",
+           "load_numpy"]
+
+# numpy, imported by load_numpy() the first time NumpyTetrisModel or a
+# PieceBank needs it: it takes longer to import than everything else here
+np = None
+
+
+def load_numpy():
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise(Exception("numpy is not installed"))
+        np = numpy
+    return np
+
+
+GRID_WIDTH = 10  # num
+GRID_HEIGHT = 20  #
+
+# Pierre Dellacherie's El-Tetris weights of LandingHeight, melted,
+# RowTransitions, ColumnTransitions, NumberOfHoles and WellSums
+DELLACHERIE = (-4.500158825082766, 3.4181268101392694, -3.2178882868487753,
+               -9.348695305445199, -7.899265427351652, -3.3855972247263626)
+
+
+T = []
+T.append([{"shape": [1, 1, 1, 1], "width": 1, "height": 4},  # I
+          {"shape": [15], "width": 4, "height": 1}])
+T.append([{"shape": [2, 7], "width": 3, "height": 2},  # T
+          {"shape": [2, 3, 2], "width": 2, "height": 3},
+          {"shape": [7, 2], "width": 3, "height": 2},
+          {"shape": [1, 3, 1], "width": 2, "height": 3}])
+T.append([{"shape": [3, 3], "width": 2, "height": 2}])  # O
+T.append([{"shape": [2, 2, 3], "width": 2, "height": 3},  # L
+          {"shape": [7, 4], "width": 3, "height": 2},
+          {"shape": [3, 1, 1], "width": 2, "height": 3},
+          {"shape": [1, 7], "width": 3, "height": 2}])
+T.append([{"shape": [7, 1], "width": 3, "height": 2},  # J
+          {"shape": [1, 1, 3], "width": 2, "height": 3},
+          {"shape": [4, 7], "width": 3, "height": 2},
+          {"shape": [3, 2, 2], "width": 2, "height": 3}])
+T.append([{"shape": [6, 3], "width": 3, "height": 2},  # Z
+          {"shape": [1, 3, 2], "width": 2, "height": 3}])
+T.append([{"shape": [3, 6], "width": 3, "height": 2},  # S
+          {"shape": [2, 3, 1], "width": 2, "height": 3}])
+# print("length of T:", len(T))
+
+
+class Rotation(object):
+    """ One rotation of a piece, precomputed for one board width. """
+    __slots__ = ("shape", "width", "height", "contour", "xs", "rows", "masks")
+
+    def __init__(self, s, board_width: int):
+        self.shape = tuple(s["shape"])
+        self.width = s["width"]
+        self.height = s["height"]
+        # (top, bottom) row offsets of the piece in each of its columns
+        contour = []
+        for c in range(self.width):
+            filled = [r for r in range(self.height) if self.shape[r] >> c & 1]
+            contour.append((filled[0], filled[-1]))
+        self.contour = tuple(contour)
+        # every legal x, rows[x] the shape shifted to column x and masks[x]
+        # the same rows packed the way BitboardTetrisModel.board is
+        self.xs = range(board_width - self.width + 1)
+        self.rows = tuple(tuple(r << x for r in self.shape) for x in self.xs)
+        self.masks = tuple(sum(r << (y * board_width) for y, r in enumerate(rows))
+                           for rows in self.rows)
+
+
+_piece_tables = {}
+
+
+def piece_tables(width: int):
+    """ T as Rotation objects for a board width, built once per width """
+    pieces = _piece_tables.get(width)
+    if pieces is None:
+        pieces = tuple(tuple(Rotation(s, width) for s in t) for t in T)
+        _piece_tables[width] = pieces
+    return pieces
+
+
+PIECES = piece_tables(GRID_WIDTH)
+
+if hasattr(int, "bit_count"):
+    popcount = int.bit_count
+else:  # python < 3.10
+    def popcount(n):
+        return bin(n).count("1")
+
+
+_feature_tables = {}
+
+
+def feature_tables(width: int):
+    """ Row lookup tables for evaluate(), built once per board width.
+
+    transitions[v]: row transitions of row v, walls count as filled.
+    bits[v]: number of filled cells in v.
+    wells[v]: empty cells of v with both neighbours filled.
+    """
+    tables = _feature_tables.get(width)
+    if tables is None:
+        full = (1 << width) - 1
+        last = 1 << (width - 1)
+        transitions = []
+        bits = []
+        wells = []
+        for v in range(1 << width):
+            left = ((v << 1) & full) | 1
+            right = (v >> 1) | last
+            transitions.append(popcount(v ^ left) + (0 if v & last else 1))
+            bits.append(popcount(v))
+            wells.append(left & right & ~v & full)
+        tables = _feature_tables[width] = (transitions, bits, wells)
+    return tables
+
+
+def well_sum(masks, bits):
+    """ WellSums of a top-down run of row well masks, bits is the popcount
+    table: a well cell at depth d adds d, so a well n deep adds 1+2+..+n """
+    total = 0
+    depth = []  # depth[k]: columns in a well at least k+1 deep
+    for well in masks:
+        if well:
+            deeper = [well]
+            for d in depth:
+                d &= well
+                if not d:
+                    break
+                deeper.append(d)
+            depth = deeper
+            for d in depth:
+                total += bits[d]
+        elif depth:
+            depth = []
+    return total
+
+
+class Direction(Enum):
+    LEFT = 1
+    RIGHT = 2
+    DOWN = 3
+
+
+class TetrisRandom(object):
+    """ 7x7 bag: every piece 7 times in a shuffled pool, then a new pool.
+    Without a seed it shuffles with the global random module, with one it
+    has its own random.Random and the sequence depends on the seed only. """
+
+    def __init__(self, seed=None):
+        self.pool = []
+        self.random = random if seed is None else random.Random(seed)
+
+    @classmethod
+    def instance(cls, *args, **kwargs):
+        if not hasattr(TetrisRandom, "_instance"):
+            TetrisRandom._instance = TetrisRandom(*args, **kwargs)
+        return TetrisRandom._instance
+
+    def next(self):
+        if len(self.pool) <= 0:
+            self.pool = [* range(7)] * 7
+            self.random.shuffle(self.pool)
+        return self.pool.pop()
+
+
+class WeightedRandom(object):
+    """ Draws every piece on its own with the given relative weights, one
+    per piece of T, e.g. more S and Z pieces to make the games harder. """
+
+    def __init__(self, weights, seed=None):
+        self.weights = weights
+        self.random = random if seed is None else random.Random(seed)
+
+    def next(self):
+        return self.random.choices(range(len(T)), self.weights)[0]
+
+
+class SequenceRandom(object):
+    """ Plays back a recorded piece sequence, e.g. a row of a PieceBank. """
+
+    def __init__(self, sequence):
+        self.sequence = sequence
+        self.index = 0
+
+    def next(self):
+        if self.index >= len(self.sequence):
+            raise(Exception("piece sequence of {} used up".format(len(self.sequence))))
+        piece = int(self.sequence[self.index])
+        self.index += 1
+        return piece
+
+
+class PieceBank(object):
+    """ Piece sequences of many games in one uint8 .npy file, row g holds
+    what TetrisRandom(seed + g) draws, or WeightedRandom(piece_weights,
+    seed + g) with piece_weights. open() maps the file read-only, so any
+    number of processes read the same pages and play the same games.
+    """
+
+    def __init__(self, sequences):
+        self.sequences = sequences
+
+    @classmethod
+    def create(cls, path, games: int, length: int, seed: int, piece_weights=None):
+        load_numpy()
+        sequences = np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8,
+                                              shape=(games, length))
+        for g in range(games):
+            if piece_weights is None:
+                r = TetrisRandom(seed + g)
+            else:
+                r = WeightedRandom(piece_weights, seed + g)
+            sequences[g] = [r.next() for _ in range(length)]
+        sequences.flush()
+        return cls(sequences)
+
+    @classmethod
+    def open(cls, path):
+        load_numpy()
+        return cls(np.load(path, mmap_mode="r"))
+
+    def __len__(self):
+        return len(self.sequences)
+
+    def randomizer(self, game: int):
+        """ a piece generator playing game number game """
+        return SequenceRandom(self.sequences[game])
+
+
+class SolveCache(object):
+    """ Bounded LRU memo of solve() answers, keyed by TetrisModel.cache_key().
+
+    Only the bare (score, x, y, rotation) answers are kept, solve() with
+    diagnostics computes them again for every move.
+    """
+
+    def __init__(self, size: int = 4096):
+        self.size = size
+        self.answers = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        answer = self.answers.get(key)
+        if answer is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.answers.move_to_end(key)
+        return answer
+
+    def put(self, key, answer):
+        self.answers[key] = answer
+        if len(self.answers) > self.size:
+            self.answers.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        return {"size": len(self.answers), "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
+
+    def __str__(self):
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups if lookups else 0
+        return "cache: {} hits, {} misses, {} evictions, hit rate {:.1%}".format(
+            self.hits, self.misses, self.evictions, rate)
+
+
+class PhaseProfile(object):
+    """ Where the time of a game goes: every call of the methods in PHASES
+    is counted, and every sample_every-th call of each is timed, so the
+    seconds of a phase are estimated from its sampled calls. The calls are
+    numbered across all profiles of the process, so games shorter than
+    sample_every calls get their share of samples too. attach() switches a
+    model to a subclass with the timed methods, a model without a profile
+    runs the plain ones and pays nothing.
+
+    candidates is what solve() spends outside landing() and the
+    evaluation: generating the placements and keeping the best one. A
+    sampled solve() times every landing() and evaluation inside it and
+    takes them out, so candidates has samples of its own (with the cost
+    of timing the calls inside, a little too high). The numpy
+    backend drops all placements at once in batch(), that counts as
+    candidates, and so do the save() and try_melt() of a lookahead search,
+    only those of the game itself count as save and melt. """
+
+    PHASES = {
+        "solve": ("solve",),
+        "landing": ("landing",),
+        "evaluate": ("score_at", "batch_evaluate"),
+        "save": ("save",),
+        "melt": ("try_melt",),
+    }
+    NAMES = ("solve", "candidates", "landing", "evaluate", "save", "melt")
+    _classes = {}
+    _ticks = dict.fromkeys(PHASES, 0)  # calls of each phase in this process
+
+    def __init__(self, sample_every: int = 16):
+        self.sample_every = sample_every
+        self.calls = dict.fromkeys(self.NAMES, 0)
+        self.sampled = dict.fromkeys(self.NAMES, 0)
+        self.sampled_seconds = dict.fromkeys(self.NAMES, 0.0)
+        self.solving = False  # inside solve()
+        self.nested = None  # seconds in landing() and evaluation inside a sampled solve()
+        self.start = None  # attach() starts the clock
+        self.elapsed = 0.0  # of the profiles merged in
+
+    @classmethod
+    def profiled(cls, model_class):
+        """ model_class with the methods of PHASES timed, made once per class """
+        if model_class not in cls._classes:
+            methods = {}
+            for phase, names in cls.PHASES.items():
+                for name in names:
+                    if hasattr(model_class, name):
+                        methods[name] = cls.timed(phase, getattr(model_class, name))
+            cls._classes[model_class] = type("Profiled" + model_class.__name__,
+                                             (model_class,), methods)
+        return cls._classes[model_class]
+
+    @classmethod
+    def timed(cls, phase, method):
+        ticks = cls._ticks
+
+        def solve(self, *args, **kwargs):
+            profile = self.profile
+            profile.calls["solve"] += 1
+            profile.calls["candidates"] += 1
+            ticks[phase] += 1
+            profile.solving = True
+            if ticks[phase] % profile.sample_every:
+                try:
+                    return method(self, *args, **kwargs)
+                finally:
+                    profile.solving = False
+            profile.nested = 0.0
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                profile.sample("solve", elapsed)
+                profile.sample("candidates", elapsed - profile.nested)
+                profile.nested = None
+                profile.solving = False
+
+        def inner(self, *args, **kwargs):
+            # landing() and the evaluation, timed also when the solve() around them is
+            profile = self.profile
+            profile.calls[phase] += 1
+            ticks[phase] += 1
+            sampled = not ticks[phase] % profile.sample_every
+            if not sampled and profile.nested is None:
+                return method(self, *args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                if sampled:
+                    profile.sample(phase, elapsed)
+                if profile.nested is not None:
+                    profile.nested += elapsed
+
+        def outer(self, *args, **kwargs):
+            # save() and try_melt() of the game, not of a lookahead search
+            profile = self.profile
+            if profile.solving:
+                return method(self, *args, **kwargs)
+            profile.calls[phase] += 1
+            ticks[phase] += 1
+            if ticks[phase] % profile.sample_every:
+                return method(self, *args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                profile.sample(phase, time.perf_counter() - start)
+
+        wrapper = {"solve": solve, "landing": inner, "evaluate": inner}.get(phase, outer)
+        wrapper.__name__ = method.__name__
+        return wrapper
+
+    def sample(self, name, seconds):
+        self.sampled[name] += 1
+        self.sampled_seconds[name] += seconds
+
+    def attach(self, model):
+        """ profile model from now on, the copies search_lookahead() makes too """
+        model.profile = self
+        if self.start is None:
+            self.start = time.perf_counter()
+        model.__class__ = self.profiled(type(model))
+        return model
+
+    def seconds(self, name):
+        """ estimated seconds of all calls of name """
+        if not self.sampled[name]:
+            return 0.0
+        return self.sampled_seconds[name] / self.sampled[name] * self.calls[name]
+
+    def stats(self):
+        """ {name: {calls, sampled, sampled_seconds, seconds}} for every name
+        of NAMES, and the elapsed seconds """
+        stats = {name: {"calls": self.calls[name], "sampled": self.sampled[name],
+                        "sampled_seconds": self.sampled_seconds[name],
+                        "seconds": self.seconds(name)} for name in self.NAMES}
+        stats["elapsed"] = self.elapsed
+        if self.start is not None:
+            stats["elapsed"] += time.perf_counter() - self.start
+        return stats
+
+    def merge(self, stats):
+        """ add the stats() of another profile, e.g. one of a worker process """
+        for name in self.NAMES:
+            self.calls[name] += stats[name]["calls"]
+            self.sampled[name] += stats[name]["sampled"]
+            self.sampled_seconds[name] += stats[name]["sampled_seconds"]
+        self.elapsed += stats["elapsed"]
+
+    def __str__(self):
+        stats = self.stats()
+        elapsed = stats["elapsed"] or 1
+        parts = []
+        for name in self.NAMES[1:]:
+            s = stats[name]
+            parts.append("{} {:.1f}us x{} {:.0%}".format(
+                name, s["seconds"] / s["calls"] * 1e6 if s["calls"] else 0,
+                s["calls"], s["seconds"] / elapsed))
+        return "profile: " + ", ".join(parts) + " of {:.1f}s".format(stats["elapsed"])
+
+
+class TetrisModel():
+    def __init__(self, w: int, h: int, randomizer=None):
+        # where the pieces come from, anything with a next() method
+        self.randomizer = randomizer or TetrisRandom.instance()
+        # print(w, h)
+        if w < 8:
+            raise(Exception("game grid width less then 8"))
+        if h < 8:
+            raise(Exception("game grid height less then 8"))
+        self.count = 0
+        self.width = w
+        self.height = h
+        self.pieces = piece_tables(w)
+        self.grid = [0] * self.height  # also sets self.tops
+        self.tables = feature_tables(w)
+        self.weights = DELLACHERIE  # weigh() multiplies the features by these
+
+        self.in_game = True
+        self.moveX = 3
+        self.moveY = 0
+        self.shape_idx = 0
+        self.next_tetris = 5
+        self.pause_move = False
+        self.cache = None  # a SolveCache to memoize solve()
+        self.lookahead = 0  # beam width of the two-piece search, 0 is greedy
+        self.max_nodes = None  # node budget of a lookahead move
+        self.max_time = None  # time budget of a lookahead move, in seconds
+        self.nodes = 0  # placements evaluated so far
+        self.profile = None  # a PhaseProfile, set by its attach()
+        self.new_tetris()
+
+    def new_tetris(self):
+        self.count += 1
+        self.tetris_idx = self.next_tetris
+        self.shape_idx = 0
+        # self.next_tetris = random.randint(0, 6)
+        # self.next_tetris = math.floor(random.SystemRandom().random() * 7)
+        # self.next_tetris = self.count % 7
+        # self.next_tetris = 5
+        self.next_tetris = self.randomizer.next()
+        self.moveX = int(self.width / 2 - 1)
+        self.moveY = 0
+
+    @property
+    def grid(self):
+        return self._grid
+
+    @grid.setter
+    def grid(self, rows):
+        self._grid = rows
+        self.rebuild_tops()
+
+    def rebuild_tops(self):
+        """ skyline: self.tops[x] is the highest filled row of column x,
+        self.height for an empty column """
+        tops = [self.height] * self.width
+        full = (1 << self.width) - 1
+        seen = 0
+        for y, row in enumerate(self.grid):
+            new = row & ~seen
+            if new:
+                seen |= row
+                for x in range(self.width):
+                    if new >> x & 1:
+                        tops[x] = y
+                if seen == full:
+                    break
+        self.tops = tops
+
+    def raise_tops(self, x: int, y: int, num: int):
+        """ update the skyline for rotation num saved at (x, y) """
+        tops = self.tops
+        for c, (top, bottom) in enumerate(self.pieces[self.tetris_idx][num].contour):
+            if y + top < tops[x + c]:
+                tops[x + c] = y + top
+
+    def collided(self, x: int, y: int, num: int = None):
+        if x < 0:
+            return True
+        # print("collided:", self.tetris_idx, x, y, num)
+        if num is None:
+            s = self.pieces[self.tetris_idx][self.shape_idx]
+        else:
+            s = self.pieces[self.tetris_idx][num]
+
+        if x > self.width - s.width:
+            return True
+        if y > self.height - s.height:
+            return True
+
+        grid = self.grid
+        for h, r in enumerate(s.rows[x]):
+            if r & grid[y+h] != 0:
+                return True
+        return False
+
+    def move(self, d: Direction):
+        ret = False
+        if d == Direction.LEFT:
+            if not self.collided(self.moveX-1, self.moveY):
+                self.moveX -= 1
+                ret = True
+        elif d == Direction.RIGHT:
+            if not self.collided(self.moveX+1, self.moveY):
+                self.moveX += 1
+                ret = True
+        elif d == Direction.DOWN:
+            if not self.collided(self.moveX, self.moveY+1):
+                self.moveY += 1
+                ret = True
+        return ret
+
+    def rotate(self):
+        rotate = False
+        s = self.pieces[self.tetris_idx]
+        if self.shape_idx >= len(s) - 1:
+            if not self.collided(self.moveX, self.moveY, 0):
+                self.shape_idx = 0
+                rotate = True
+        elif not self.collided(self.moveX, self.moveY, self.shape_idx+1):
+            self.shape_idx += 1
+            rotate = True
+        return rotate
+
+    def save(self):
+        x = self.moveX
+        y = self.moveY
+        grid = self.grid
+        for h, r in enumerate(self.pieces[self.tetris_idx][self.shape_idx].rows[x]):
+            grid[h + y] = grid[h + y] | r
+        if y < 0:
+            self.rebuild_tops()
+        else:
+            self.raise_tops(x, y, self.shape_idx)
+
+        if self.grid[0] > 0:
+            self.in_game = False
+
+    def try_melt(self):
+        melted = []
+        h = self.height - 1
+        while h > 0:
+            if 1 << self.width <= self.grid[h] + 1:
+                # print("try_melt", h, grid[h])
+                melted.append(h)
+                for y in range(h, 0, -1):
+                    self.grid[y] = self.grid[y - 1]
+                h += +1
+            h -= 1
+        if melted:
+            self.rebuild_tops()
+        return melted
+
+    def features(self, grid):
+        """ melted, RowTransitions, ColumnTransitions, NumberOfHoles and
+        WellSums of a grid with the piece already put in """
+        RowTransitions = 0
+        ColumnTransitions = 0
+        NumberOfHoles = 0
+        WellSums = 0
+
+        # row 0 is never melted, it slides down with the rows above
+        full = (1 << self.width) - 1
+        rows = [r for r in grid[1:] if r != full]
+        melted = self.height - 1 - len(rows)
+        if melted:
+            grid = [grid[0]] * (melted + 1) + rows
+
+        transitions, bits, wells = self.tables
+        above = 0  # the row above, the top wall is empty
+        covered = 0  # OR of all rows above, empty cells under it are holes
+        depth = []  # depth[k]: columns in a well at least k+1 deep
+        for row in grid:
+            RowTransitions += transitions[row]
+            ColumnTransitions += bits[above ^ row]
+            NumberOfHoles += bits[covered & ~row]
+            covered |= row
+            above = row
+            # well_sum() inlined: this loop runs for every placement, and
+            # the helper would need the well masks of the grid as a list
+            well = wells[row]
+            if well:
+                deeper = [well]
+                for d in depth:
+                    d &= well
+                    if not d:
+                        break
+                    deeper.append(d)
+                depth = deeper
+                for d in depth:
+                    WellSums += bits[d]  # 1+2+..+n for a well n deep
+            elif depth:
+                depth = []
+        ColumnTransitions += bits[full & ~above]  # the floor is filled
+
+        if grid[0]:
+            # a column filled at row 0 counts its holes from its second
+            # filled cell, as the original per-cell loop did.
+            pending = grid[0]
+            for y in range(1, self.height):
+                hit = grid[y] & pending
+                if hit:
+                    NumberOfHoles -= y * bits[hit]
+                    pending &= ~hit
+                    if not pending:
+                        break
+
+        return melted, RowTransitions, ColumnTransitions, NumberOfHoles, WellSums
+
+    def weigh(self, LandingHeight, melted, RowTransitions, ColumnTransitions,
+              NumberOfHoles, WellSums):
+        """ the weighted sum of the six El-Tetris features """
+        w = self.weights
+        return (w[0] * LandingHeight +
+                w[1] * melted +
+                w[2] * RowTransitions +
+                w[3] * ColumnTransitions +
+                w[4] * NumberOfHoles +
+                w[5] * WellSums)
+
+    def score(self, grid, try_y, try_num):
+        """ the score of evaluate() alone, no diagnostics are built """
+        height = self.pieces[self.tetris_idx][try_num].height
+        return self.weigh(20 - (try_y + height) + (height-1)/2, *self.features(grid))
+
+    def evaluate(self, grid, try_x, try_y, try_num):
+        """ Impletment of Pierre Dellacherie's AI algorithm (El-Tetris) """
+        (melted, RowTransitions, ColumnTransitions,
+         NumberOfHoles, WellSums) = self.features(grid)
+        s = self.pieces[self.tetris_idx][try_num]
+        lh = 20 - (try_y + s.height)
+        LandingHeight = lh + (s.height-1)/2
+
+        score = self.weigh(LandingHeight, melted, RowTransitions,
+                           ColumnTransitions, NumberOfHoles, WellSums)
+        return [score, try_x, try_y, try_num,
+                (self.count, lh, s.height, LandingHeight, melted, RowTransitions,
+                 ColumnTransitions, NumberOfHoles, WellSums)]
+
+    def landing(self, x: int, num: int):
+        """ row where rotation num dropped at column x comes to rest,
+        -1 if it collides right at the top """
+        # the lowest cell of each piece column stops one row above the
+        # skyline, so the piece rests on the column where that comes first
+        tops = self.tops
+        y = self.height
+        c = x
+        for top, bottom in self.pieces[self.tetris_idx][num].contour:
+            if tops[c] - bottom < y:
+                y = tops[c] - bottom
+            c += 1
+        if y > 0:
+            return y - 1
+        return self.scan_landing(x, num)
+
+    def scan_landing(self, x: int, num: int):
+        """ landing() by testing one row after the other from the top,
+        for when the piece does not even fit at row 0 """
+        s = self.pieces[self.tetris_idx][num]
+        rows = s.rows[x]
+        grid = self.grid
+        y = 0
+        while y <= self.height - s.height:
+            collided = False
+            for h, r in enumerate(rows):
+                if r & grid[y+h] != 0:
+                    collided = True
+                    break
+            if not collided:
+                y += 1
+            else:
+                break
+        return y - 1
+
+    def place(self, x: int, y: int, num: int):
+        """ a copy of the grid with rotation num put at (x, y) """
+        g = [*self.grid]
+        for h, r in enumerate(self.pieces[self.tetris_idx][num].rows[x]):
+            g[h + y] = g[h + y] | r
+        return g
+
+    def cache_key(self):
+        # other weights give other answers on the same grid, and models of
+        # other board sizes (a proxy board in training) can share the cache
+        return (self.width, self.height, tuple(self.grid), self.tetris_idx, self.weights)
+
+    def solve(self, diagnostics=False):
+        """ best (score, x, y, rotation) for the current piece, with
+        diagnostics a list [score, x, y, rotation, diagnostics] where the
+        last item is the tuple evaluate() gives for that placement """
+        search = self.search_lookahead if self.lookahead else self.search
+        if self.cache is None:
+            answer = search()
+        else:
+            key = self.cache_key()
+            if self.lookahead:
+                key = (key, self.next_tetris)
+            answer = self.cache.get(key)
+            if answer is None:
+                answer = search()
+                self.cache.put(key, answer)
+        if diagnostics and len(answer) > 1:
+            return [*answer, self.answer(answer[1], answer[2], answer[3])[4]]
+        return answer
+
+    def score_at(self, x: int, y: int, num: int):
+        """ score of rotation num dropped to (x, y) """
+        return self.score(self.place(x, y, num), y, num)
+
+    def moves(self):
+        """ (score, x, y, rotation) of every placement of the current piece """
+        moves = []
+        for idx, s in enumerate(self.pieces[self.tetris_idx]):
+            for x in s.xs:
+                y = self.landing(x, idx)
+                moves.append((self.score_at(x, y, idx), x, y, idx))
+        return moves
+
+    def answer(self, x: int, y: int, num: int):
+        """ the full evaluate() result of one placement """
+        return self.evaluate(self.place(x, y, num), x, y, num)
+
+    def search(self):
+        """ (score, x, y, rotation) of the best placement, only the best
+        one so far is kept while the candidates are scored """
+        landing = self.landing
+        score_at = self.score_at
+        best = -1000000
+        bx = by = bn = 0
+        nodes = 0
+        for idx, s in enumerate(self.pieces[self.tetris_idx]):
+            for x in s.xs:
+                y = landing(x, idx)
+                score = score_at(x, y, idx)
+                nodes += 1
+                if score > best:
+                    best = score
+                    bx = x
+                    by = y
+                    bn = idx
+        self.nodes += nodes
+        if best <= -1000000:
+            return (-1000000, )
+        return (best, bx, by, bn)
+
+    def search_lookahead(self):
+        """ Two-piece search: the best self.lookahead placements of the
+        current piece are each followed by the best placement of
+        next_tetris, a pair scores the sum of both evaluations. Stops
+        expanding when max_nodes or max_time is used up, the first
+        candidate is always expanded. """
+        start = time.perf_counter()
+        first = self.moves()
+        self.nodes += len(first)
+        first.sort(key=lambda move: move[0], reverse=True)
+        child = copy.copy(self)
+        child.cache = None
+        child.lookahead = 0
+        child.nodes = 0
+        best = None
+        for score, x, y, num in first[:self.lookahead]:
+            if best is not None:
+                if self.max_nodes is not None and child.nodes >= self.max_nodes:
+                    break
+                if self.max_time is not None and time.perf_counter() - start >= self.max_time:
+                    break
+            child.grid = self.place(x, y, num)
+            child.try_melt()
+            child.tetris_idx = self.next_tetris
+            total = score + child.search()[0]
+            if best is None or total > best[0]:
+                best = (total, x, y, num)
+        self.nodes += child.nodes
+        if best is None:
+            return (-1000000, )
+        return best
+
+
+class IncrementalTetrisModel(TetrisModel):
+    """ TetrisModel keeping the per-row feature terms of the committed board.
+
+    A placement only changes the rows the piece lands on, and the holes of
+    the columns under it, so score_at() scores it as a delta over those rows
+    and columns. Placements that clear lines or reach row 0 are evaluated
+    in full. save() moves the cached terms by the same delta; they are
+    rebuilt after a melt, a new grid, or a save() the delta does not cover.
+    With check set every delta is compared with the full evaluate(), and
+    every save() with a rebuild.
+    """
+
+    def __init__(self, w: int, h: int, randomizer=None):
+        self.stale = True
+        self.check = False
+        super().__init__(w, h, randomizer)
+
+    def rebuild_tops(self):
+        super().rebuild_tops()
+        self.stale = True
+
+    def save(self):
+        x = self.moveX
+        y = self.moveY
+        num = self.shape_idx
+        # the delta of the saved placement, taken before the grid changes
+        terms = None
+        if not self.stale and self.delta and y > 0:
+            terms = self.delta_features(x, y, num)
+        super().save()
+        if terms is None:
+            self.stale = True
+            return
+        new, RowTransitions, ColumnTransitions, NumberOfHoles, WellSums = terms
+        transitions, bits, wells = self.tables
+        grid = self.grid
+        end = y + len(new)
+        above = grid[y - 1]
+        for h, r in enumerate(new):
+            self.row_transitions[y + h] = transitions[r]
+            self.pair_transitions[y + h] = bits[above ^ r]
+            self.well_masks[y + h] = wells[r]
+            above = r
+        if end < self.height:
+            self.pair_transitions[end] = bits[above ^ grid[end]]
+        self.totals = (RowTransitions, ColumnTransitions, NumberOfHoles, WellSums)
+        if self.check:
+            kept = (self.row_transitions, self.pair_transitions, self.well_masks, self.totals)
+            self.rebuild_features()
+            if kept != (self.row_transitions, self.pair_transitions, self.well_masks,
+                        self.totals):
+                raise(Exception("incremental save differs at {}: {} {}".format(
+                    (x, y, num), kept[3], self.totals)))
+
+    def rebuild_features(self):
+        transitions, bits, wells = self.tables
+        grid = self.grid
+        full = (1 << self.width) - 1
+        self.row_transitions = [transitions[r] for r in grid]
+        self.pair_transitions = [bits[a ^ r] for a, r in zip([0] + grid[:-1], grid)]
+        self.well_masks = [wells[r] for r in grid]
+        holes = 0
+        covered = 0
+        for r in grid:
+            holes += bits[covered & ~r]
+            covered |= r
+        self.totals = (sum(self.row_transitions),
+                       sum(self.pair_transitions) + bits[full & ~grid[-1]],
+                       holes, well_sum(self.well_masks, bits))
+        # boards with row 0 taken or full rows left are scored in full
+        self.delta = not grid[0] and full not in grid
+        self.stale = False
+
+    def delta_features(self, x: int, y: int, num: int):
+        """ (rows, RowTransitions, ColumnTransitions, NumberOfHoles, WellSums)
+        of the board with rotation num put at (x, y), rows being the new
+        rows y, y + 1, ... of the piece; None when it has to be evaluated in
+        full. Needs y > 0 and the cached terms of a board without full rows """
+        grid = self.grid
+        full = (1 << self.width) - 1
+        s = self.pieces[self.tetris_idx][num]
+        # the cells between the piece and the old skyline become holes; a
+        # piece that slipped under the skyline, or one that clears lines,
+        # is evaluated in full
+        tops = self.tops
+        NumberOfHoles = self.totals[2]
+        c = x
+        for top, bottom in s.contour:
+            NumberOfHoles += tops[c] - y - bottom - 1
+            if tops[c] <= y + bottom:
+                return None
+            c += 1
+        new = [grid[y + h] | r for h, r in enumerate(s.rows[x])]
+        if full in new:
+            return None
+
+        transitions, bits, wells = self.tables
+        height = self.height
+        row_t = self.row_transitions
+        pair_t = self.pair_transitions
+        well_masks = self.well_masks
+        RowTransitions, ColumnTransitions, _, WellSums = self.totals
+        end = y + len(new)
+        above = grid[y - 1]
+        for h, r in enumerate(new):
+            RowTransitions += transitions[r] - row_t[y + h]
+            ColumnTransitions += bits[above ^ r] - pair_t[y + h]
+            above = r
+        if end < height:
+            ColumnTransitions += bits[above ^ grid[end]] - pair_t[end]
+        else:
+            ColumnTransitions += bits[full & ~above] - bits[full & ~grid[-1]]
+
+        # redo the wells of the columns that changed, over the rows
+        # their wells span before or after the placement
+        new_wells = [wells[r] for r in new]
+        changed = 0
+        for h, m in enumerate(new_wells):
+            changed |= m ^ well_masks[y + h]
+        if changed:
+            lo = y
+            while lo > 0 and well_masks[lo - 1] & changed:
+                lo -= 1
+            hi = end
+            while hi < height and well_masks[hi] & changed:
+                hi += 1
+            old = [m & changed for m in well_masks[lo:hi]]
+            cur = old[:y - lo] + [m & changed for m in new_wells] + old[end - lo:]
+            WellSums += well_sum(cur, bits) - well_sum(old, bits)
+        return new, RowTransitions, ColumnTransitions, NumberOfHoles, WellSums
+
+    def score_at(self, x: int, y: int, num: int):
+        if self.stale:
+            self.rebuild_features()
+        # a placement reaching row 0 is evaluated in full
+        terms = None
+        if self.delta and y > 0:
+            terms = self.delta_features(x, y, num)
+        if terms is None:
+            return super().score_at(x, y, num)
+        _, RowTransitions, ColumnTransitions, NumberOfHoles, WellSums = terms
+
+        s = self.pieces[self.tetris_idx][num]
+        melted = 0
+        lh = 20 - (y + s.height)
+        LandingHeight = lh + (s.height-1)/2
+        score = self.weigh(LandingHeight, melted, RowTransitions, ColumnTransitions,
+                           NumberOfHoles, WellSums)
+        if self.check:
+            r = self.answer(x, y, num)
+            if r[0] != score or r[4][5:9] != (RowTransitions, ColumnTransitions,
+                                             NumberOfHoles, WellSums):
+                raise(Exception("incremental features differ at {}: {} {}".format(
+                    (x, y, num), (RowTransitions, ColumnTransitions,
+                                  NumberOfHoles, WellSums), r[4][5:9])))
+        return score
+
+
+class BitboardTetrisModel(TetrisModel):
+    """ TetrisModel with the whole grid packed into a single int.
+
+    Row y lives in bits [y * width, (y + 1) * width), bit x of a row is
+    column x, same as the rows of TetrisModel.grid. Placing a piece,
+    finding full rows and collapsing them are a few big-int operations.
+    """
+
+    def __init__(self, w: int, h: int, randomizer=None):
+        self.board = 0
+        super().__init__(w, h, randomizer)
+        full = (1 << w) - 1
+        self.full_row = full
+        self.row_mask = [full << (y * w) for y in range(h)]
+        self.above_mask = [(1 << (y * w)) - 1 for y in range(h + 1)]
+        self.all_mask = (1 << (w * h)) - 1
+        self.first_col = sum(1 << (y * w) for y in range(h))
+        self.last_col = self.first_col << (w - 1)
+
+    @property
+    def grid(self):
+        w = self.width
+        full = (1 << w) - 1
+        b = self.board
+        return [(b >> (y * w)) & full for y in range(self.height)]
+
+    @grid.setter
+    def grid(self, rows):
+        w = self.width
+        b = 0
+        for y, r in enumerate(rows):
+            b |= r << (y * w)
+        self.board = b
+        self.rebuild_tops()
+
+    def collided(self, x: int, y: int, num: int = None):
+        if x < 0:
+            return True
+        if num is None:
+            num = self.shape_idx
+        s = self.pieces[self.tetris_idx][num]
+        if x > self.width - s.width:
+            return True
+        if y > self.height - s.height:
+            return True
+        if y < 0:
+            return super().collided(x, y, num)
+        return (s.masks[x] << (y * self.width)) & self.board != 0
+
+    def cache_key(self):
+        return (self.width, self.height, self.board, self.tetris_idx, self.weights)
+
+    def scan_landing(self, x: int, num: int):
+        s = self.pieces[self.tetris_idx][num]
+        m = s.masks[x]
+        bottom = self.height - s.height
+        y = 0
+        while y <= bottom and not m & self.board:
+            m <<= self.width
+            y += 1
+        return y - 1
+
+    def save(self):
+        x = self.moveX
+        y = self.moveY
+        if y < 0:
+            # solve() gives y = -1 when nothing fits, keep the list behaviour
+            g = self.grid
+            for h, r in enumerate(self.pieces[self.tetris_idx][self.shape_idx].rows[x]):
+                g[h + y] = g[h + y] | r
+            self.grid = g
+        else:
+            self.board |= self.pieces[self.tetris_idx][self.shape_idx].masks[x] << (y * self.width)
+            self.raise_tops(x, y, self.shape_idx)
+
+        if self.board & self.row_mask[0]:
+            self.in_game = False
+
+    def full_rows(self, b):
+        """ full rows of board b, bottom up, row 0 is never melted """
+        rm = self.row_mask
+        return [y for y in range(self.height - 1, 0, -1) if b & rm[y] == rm[y]]
+
+    def collapse(self, b, rows):
+        """ remove rows (bottom up) from board b, everything above drops """
+        top = self.row_mask[0]
+        for y in reversed(rows):
+            above = self.above_mask[y]
+            b = ((b & above) << self.width) | (b & top) | (b & ~self.above_mask[y + 1])
+        return b
+
+    def try_melt(self):
+        rows = self.full_rows(self.board)
+        if rows:
+            self.board = self.collapse(self.board, rows)
+            self.rebuild_tops()
+        # same numbering as TetrisModel: each row index is taken after the
+        # previous rows have already been removed
+        return [y + i for i, y in enumerate(rows)]
+
+    def features(self, b):
+        """ TetrisModel.features of a packed board, same values """
+        w = self.width
+        all_mask = self.all_mask
+        first_col = self.first_col
+        last_col = self.last_col
+
+        rows = self.full_rows(b)
+        melted = len(rows)
+        if melted:
+            b = self.collapse(b, rows)
+
+        # left / right neighbour of every cell, the walls count as filled
+        left = ((b << 1) & all_mask & ~first_col) | first_col
+        right = ((b >> 1) & ~last_col) | last_col
+        RowTransitions = popcount(b ^ left) + popcount(last_col & ~b)
+
+        bottom = self.row_mask[-1]
+        ColumnTransitions = popcount(b ^ ((b << w) & all_mask)) + popcount(bottom & ~b)
+
+        covered = b
+        shift = w
+        while shift < w * self.height:
+            covered |= covered << shift
+            shift <<= 1
+        NumberOfHoles = popcount(covered & all_mask & ~b)
+        if b & self.row_mask[0]:
+            # a column filled at row 0 counts its holes from the second
+            # filled cell in TetrisModel.evaluate, do the same here.
+            pending = b & self.full_row
+            for y in range(1, self.height):
+                hit = (b >> (y * w)) & pending
+                if hit:
+                    NumberOfHoles -= y * popcount(hit)
+                    pending &= ~hit
+                    if not pending:
+                        break
+
+        # a well cell at depth d of its well adds d, i.e. 1+2+..+n per well
+        WellSums = 0
+        well = left & right & all_mask & ~b
+        while well:
+            WellSums += popcount(well)
+            well &= well << w
+
+        return melted, RowTransitions, ColumnTransitions, NumberOfHoles, WellSums
+
+    def place_board(self, x: int, y: int, num: int):
+        """ the board with rotation num put at (x, y) """
+        if y < 0:
+            # nothing fits, the piece wraps around the way place() puts it
+            g = self.place(x, y, num)
+            b = 0
+            for row, r in enumerate(g):
+                b |= r << (row * self.width)
+            return b
+        return self.board | (self.pieces[self.tetris_idx][num].masks[x] << (y * self.width))
+
+    def score_at(self, x: int, y: int, num: int):
+        return self.score(self.place_board(x, y, num), y, num)
+
+    def answer(self, x: int, y: int, num: int):
+        return self.evaluate(self.place_board(x, y, num), x, y, num)
+
+
+class NumpyTetrisModel(TetrisModel):
+    """ TetrisModel scoring all candidates of a piece in one batch.
+
+    solve() stacks every (rotation, x) candidate board into one
+    (candidates, height) array and computes the El-Tetris features of all
+    of them with numpy, then takes the argmax. Same answers as TetrisModel.
+    """
+
+    def __init__(self, w: int, h: int, randomizer=None):
+        load_numpy()
+        super().__init__(w, h, randomizer)
+        self.dtype = np.uint16 if w <= 16 else np.uint32
+        transitions, bits, wells = self.tables
+        self.np_transitions = np.array(transitions, dtype=np.int64)
+        self.np_bits = np.array(bits, dtype=np.int64)
+        self.np_wells = np.array(wells, dtype=self.dtype)
+        # per piece: rotation, x, height, the 4 rows, and the columns with
+        # their bottom contour of every candidate
+        self.candidates = []
+        for t in self.pieces:
+            nums, xs, heights, stamps, columns, bottoms = [], [], [], [], [], []
+            for num, s in enumerate(t):
+                pad = 4 - s.width
+                for x in s.xs:
+                    nums.append(num)
+                    xs.append(x)
+                    heights.append(s.height)
+                    stamps.append(s.rows[x] + (0,) * (4 - s.height))
+                    columns.append([x + c for c in range(s.width)] + [w] * pad)
+                    bottoms.append([bottom for top, bottom in s.contour] + [0] * pad)
+            self.candidates.append((nums, xs, np.array(heights),
+                                    np.array(stamps, dtype=self.dtype),
+                                    np.array(columns), np.array(bottoms)))
+
+    def batch_melt(self, boards):
+        """ clear the full rows of a stack of boards the way evaluate()
+        does, returns the new boards and the number of rows melted """
+        height = boards.shape[1]
+        is_full = boards == (1 << self.width) - 1
+        is_full[:, 0] = False
+        melted = is_full.sum(1)
+        if melted.any():
+            # full rows to the top, then row 0, then the rest in order;
+            # everything above the remaining rows becomes a copy of row 0
+            key = np.where(is_full, 0, 2)
+            key[:, 0] = 1
+            order = np.argsort(key, axis=1, kind="stable")
+            top = boards[:, :1]
+            boards = np.take_along_axis(boards, order, 1)
+            boards = np.where(np.arange(height) < melted[:, None], top, boards)
+        return boards, melted
+
+    def batch_features(self, boards, ys, heights):
+        """ the six El-Tetris features of a stack of boards, each an array:
+        LandingHeight, melted, RowTransitions, ColumnTransitions,
+        NumberOfHoles, WellSums """
+        n, height = boards.shape
+        full = (1 << self.width) - 1
+        bits = self.np_bits
+        boards, melted = self.batch_melt(boards)
+
+        above = np.zeros_like(boards)
+        above[:, 1:] = boards[:, :-1]
+        RowTransitions = self.np_transitions[boards].sum(1)
+        ColumnTransitions = (bits[above ^ boards].sum(1) +
+                             bits[full & ~boards[:, -1]])
+        covered = np.bitwise_or.accumulate(above, axis=1)
+        NumberOfHoles = bits[covered & ~boards].sum(1)
+        for i in np.nonzero(boards[:, 0])[0]:
+            # same row-0 quirk as TetrisModel.evaluate
+            pending = int(boards[i, 0])
+            for y in range(1, height):
+                hit = int(boards[i, y]) & pending
+                if hit:
+                    NumberOfHoles[i] -= y * popcount(hit)
+                    pending &= ~hit
+                    if not pending:
+                        break
+
+        well = self.np_wells[boards]
+        WellSums = bits[well].sum(1)
+        deeper = well
+        while True:
+            d = np.zeros_like(well)
+            d[:, 1:] = well[:, 1:] & deeper[:, :-1]
+            if not d.any():
+                break
+            WellSums += bits[d].sum(1)
+            deeper = d
+
+        lh = 20 - (ys + heights)
+        LandingHeight = lh + (heights-1)/2
+        return (LandingHeight, melted, RowTransitions, ColumnTransitions,
+                NumberOfHoles, WellSums)
+
+    def batch_evaluate(self, boards, ys, heights):
+        """ El-Tetris scores of a stack of boards, the ones solve() builds """
+        return self.weigh(*self.batch_features(boards, ys, heights))
+
+    def batch(self):
+        """ rotations, xs, ys and scores of all placements """
+        nums, xs, heights, stamps, columns, bottoms = self.candidates[self.tetris_idx]
+        n = len(nums)
+        height = self.height
+        # drop every candidate at once from the skyline, the spare column
+        # at the end stands in for the missing columns of narrow pieces
+        tops = np.array(self.tops + [2 * height])
+        ys = (tops[columns] - bottoms).min(1) - 1
+        for i in np.nonzero(ys < 0)[0]:
+            ys[i] = self.scan_landing(xs[i], nums[i])
+        # 4 spare rows at the bottom take the padding of short pieces, and
+        # the pieces that do not fit at all (y = -1) are scored one by one
+        boards = np.zeros((n, height + 4), dtype=self.dtype)
+        boards[:, :height] = self.grid
+        stuck = ys < 0
+        rows = np.where(stuck, height, ys)[:, None] + np.arange(4)
+        boards[np.arange(n)[:, None], rows] |= stamps
+        scores = self.batch_evaluate(boards[:, :height], ys, heights)
+        for i in np.nonzero(stuck)[0]:
+            scores[i] = self.score_at(xs[i], -1, nums[i])
+        return nums, xs, ys, scores
+
+    def moves(self):
+        nums, xs, ys, scores = self.batch()
+        return list(zip(scores.tolist(), xs, ys.tolist(), nums))
+
+    def search(self):
+        nums, xs, ys, scores = self.batch()
+        self.nodes += len(nums)
+        best = int(np.argmax(scores))
+        return (float(scores[best]), xs[best], int(ys[best]), nums[best])
+
+
+# the evaluator backends by name, they all give the same answers
+BACKENDS = {
+    "list": TetrisModel,
+    "incremental": IncrementalTetrisModel,
+    "bitboard": BitboardTetrisModel,
+    "numpy": NumpyTetrisModel,
+}
+
+
+def new_model(backend="list", weights=DELLACHERIE, seed=None, cache_size=0,
+              lookahead=0, budget=None, check=False, profile=False):
+    """ a model for the AI modes: backend is a name in BACKENDS, weights
+    the six El-Tetris weights, seed makes the pieces TetrisRandom(seed)
+    draws instead of the shared generator, cache_size > 0 memoizes solve(),
+    lookahead > 0 searches two pieces deep keeping that many candidates,
+    budget caps a lookahead move in seconds, check verifies the
+    incremental features against a full evaluate(), profile attaches a
+    PhaseProfile """
+    if backend not in BACKENDS:
+        raise(Exception("unknown backend {}, try one of {}".format(
+            backend, ", ".join(BACKENDS))))
+    if len(weights) != 6:
+        raise(Exception("need 6 weights, got {}".format(len(weights))))
+    randomizer = None if seed is None else TetrisRandom(seed)
+    m = BACKENDS[backend](GRID_WIDTH, GRID_HEIGHT, randomizer)
+    m.weights = tuple(weights)
+    m.check = check
+    if cache_size:
+        m.cache = SolveCache(cache_size)
+    m.lookahead = lookahead
+    m.max_time = budget
+    if profile:
+        PhaseProfile().attach(m)
+    return m
+
+
+def verify(count=None, **options):
+    # 验证模式，无GUI界面动画
+    score = 0
+    start = datetime.now()
+    m = new_model(**options)
+    ts = int(time.time())
+    while m.in_game:
+        m.new_tetris()
+        # 每秒打印一次, 只有这时才需要诊断信息
+        report = int(time.time()) != ts
+        answer = m.solve(diagnostics=report)  # 尝试解题
+        m.moveX = answer[1]
+        m.moveY = answer[2]
+        m.shape_idx = answer[3]
+        m.save()
+        melted = m.try_melt()
+        score += len(melted)
+        if report:
+            ts = int(time.time())
+            dt = str(datetime.now() - start).split(".")[0]
+            nps = m.nodes / (datetime.now() - start).total_seconds()
+            print(dt, "score:", score, "nodes/s: {:.0f}".format(nps), answer)
+            if m.profile is not None:
+                print(dt, m.profile)
+        if count and score >= count:
+            dt = str(datetime.now() - start).split(".")[0]
+            print(dt, "score:", score, answer)
+            break
+    if m.cache is not None:
+        print(m.cache)
+    if m.profile is not None:
+        print(m.profile)
+
+
+def play_seeded_game(seed, limit=None, **options):
+    """ one silent game of new_model(seed=seed, **options), played the way
+    verify() plays, stopped after limit pieces if it gets that far """
+    m = new_model(seed=seed, **options)
+    lines = 0
+    pieces = 0
+    start = time.perf_counter()
+    while m.in_game and (limit is None or pieces < limit):
+        m.new_tetris()
+        answer = m.solve()
+        m.moveX = answer[1]
+        m.moveY = answer[2]
+        m.shape_idx = answer[3]
+        m.save()
+        lines += len(m.try_melt())
+        pieces += 1
+    result = {"seed": seed, "lines": lines, "pieces": pieces,
+              "seconds": time.perf_counter() - start, "over": not m.in_game}
+    if m.profile is not None:
+        result["profile"] = m.profile.stats()
+    return result
+
+
+def verify_games(games, jobs=None, seed=0, limit=None, **options):
+    """ play games games seeded seed, seed + 1, ... on jobs processes,
+    print every game as it ends and then the statistics over all of them,
+    which are returned as a dict """
+    if games < 1:
+        raise(Exception("verify_games needs at least one game, got {}".format(games)))
+    # only needed here, verify() and the GUI start faster without them
+    import statistics
+    import multiprocessing
+    from functools import partial
+
+    start = time.perf_counter()
+    jobs = jobs or multiprocessing.cpu_count()
+    results = []
+    profile = None
+    with multiprocessing.Pool(jobs) as pool:
+        play = partial(play_seeded_game, limit=limit, **options)
+        for r in pool.imap_unordered(play, range(seed, seed + games)):
+            results.append(r)
+            print("game {}/{} seed {}: {} lines, {} pieces, {:.1f}s, {:.0f} pieces/s{}".format(
+                len(results), games, r["seed"], r["lines"], r["pieces"], r["seconds"],
+                r["pieces"] / r["seconds"], "" if r["over"] else " (stopped)"))
+            if "profile" in r:
+                profile = profile or PhaseProfile()
+                profile.merge(r["profile"])
+    wall = time.perf_counter() - start
+    lines = sorted(r["lines"] for r in results)
+    pieces = sum(r["pieces"] for r in results)
+    seconds = sum(r["seconds"] for r in results)
+    summary = {
+        "games": len(results), "jobs": jobs,
+        "mean": statistics.mean(lines), "median": statistics.median(lines),
+        "p95": lines[min(len(lines) - 1, math.ceil(0.95 * len(lines)) - 1)],
+        "min": lines[0], "max": lines[-1],
+        "stdev": statistics.stdev(lines) if len(lines) > 1 else 0.0,
+        "pieces": pieces, "seconds": wall,
+        "pieces_per_second_per_core": pieces / seconds if seconds else 0.0,
+        "pieces_per_second": pieces / wall,
+    }
+    print("lines: mean {mean:.1f}, median {median:.1f}, p95 {p95}, min {min}, max {max}, "
+          "stdev {stdev:.1f} over {games} games".format(**summary))
+    print("pieces: {pieces} in {seconds:.1f}s on {jobs} processes, "
+          "{pieces_per_second_per_core:.0f} pieces/s per core, "
+          "{pieces_per_second:.0f} pieces/s in total".format(**summary))
+    if profile is not None:
+        summary["profile"] = profile.stats()
+        print(profile)
+    return summary
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#
+# The tkinter window: GameView draws the board, GameController plays the
+# model on a timer. tetris.py only imports this when a window is opened.
+#
+
+import time
+import random
+import sys
+from datetime import datetime
+from tkinter import Tk, Frame, Canvas
+
+from tetris_core import TetrisModel, Direction, new_model, GRID_WIDTH, GRID_HEIGHT
+
+STEP = 19  # pixel, how many pixel each step moves.
+SIDE = 17  # pixel, side length of square
+BOARD_WIDTH = BOARD_HEIGHT = STEP * 24  # game window size
+DELAY = 300  # micro second
+AI_DELAY = 5  # micro second
+
+GRID_TOP = STEP*2  # pixel, position of grid.
+GRID_LEFT = (BOARD_WIDTH-STEP*GRID_WIDTH)/2  # pixel
+
+COLORS = ["red", "lightblue", "green", "brown",
+          "yellow", "pink", "orange", "purple"]
+
+
+class GameView(Canvas):
+    def __init__(self, w=BOARD_WIDTH, h=BOARD_HEIGHT):
+        super().__init__(width=w, height=h,
+                         background="black", highlightthickness=0)
+        self.create_text(SIDE*4, SIDE*3, text="01:23:45", tag="time",
+                         fill="white", font=("Arial", 5+SIDE//2), justify='center')
+        self.create_text(SIDE*4, SIDE*5, text="Score: 0", tag="score",
+                         fill="white", font=("Arial", 5+SIDE//2), justify='center')
+        self.create_text(SIDE*4, SIDE*7, text="X: 0",
+                         tag="xxx", fill="white", font=("Arial", 3+STEP//2), justify='center')
+        self.create_text(SIDE*4, SIDE*8, text="Y: 0",
+                         tag="yyy", fill="white", font=("Arial", 3+STEP//2), justify='center')
+        self.create_text(SIDE*4, SIDE*9, text="T: 0",
+                         tag="ttt", fill="white", font=("Arial", 3+STEP//2), justify='center')
+        self.create_text(SIDE*4, SIDE*10, text="I: 0",
+                         tag="iii", fill="white", font=("Arial", 3+STEP//2), justify='center')
+        self.create_rectangle(GRID_LEFT, GRID_TOP, GRID_LEFT + GRID_WIDTH * STEP,
+                              GRID_TOP + GRID_HEIGHT * STEP,
+                              fill="#1f1f1f", width=0, tag="grid")
+        self.create_text(GRID_LEFT + SIDE*(GRID_WIDTH+1)/2, SIDE*10, text="",
+                         tag="hardcore", fill="red", font=("Arial", 6+STEP//2), justify='center')
+        self.pack()
+
+    def draw_tile(self, x, y, color, tag):
+        rx = GRID_LEFT + x * STEP
+        ry = GRID_TOP + y * STEP
+        self.create_rectangle(rx, ry, rx + SIDE, ry + SIDE,
+                              fill=color, width=0, tag=tag)
+
+    def redraw_shape(self, x, y, color, shape, tag, save=False):
+        dots = self.find_withtag(tag)
+        for dot in dots:
+            self.delete(dot)
+        if save:
+            tag = "save"
+        for h in range(shape.height):
+            for w in range(shape.width):
+                if (shape.shape[h] >> w) & 1:
+                    self.draw_tile(x + w, y + h, color, tag)
+
+    def melt_tile(self, n):
+        tag = "save"
+        tiles = self.find_withtag(tag)
+        # print("melt_tile", n, len(tiles))
+        for tile in tiles:
+            c = self.coords(tile)
+            if c[1] == n*STEP+GRID_TOP:
+                self.delete(tile)
+            if c[1] < n*STEP+GRID_TOP:
+                self.move(tile, 0, STEP)
+
+    def draw_score(self, dt, s, x, y, t, i, h=False):
+        tm = self.find_withtag("time")
+        self.itemconfigure(tm, text=dt)
+        score = self.find_withtag("score")
+        self.itemconfigure(score, text="Score: {0}".format(s))
+        xxx = self.find_withtag("xxx")
+        self.itemconfigure(xxx, text="X: {}".format(x))
+        yyy = self.find_withtag("yyy")
+        self.itemconfigure(yyy, text="Y: {}".format(y))
+        ttt = self.find_withtag("ttt")
+        self.itemconfigure(ttt, text="T: {}".format(t))
+        iii = self.find_withtag("iii")
+        self.itemconfigure(iii, text="I: {}".format(i))
+        hardcore = self.find_withtag("hardcore")
+        if h:
+            self.itemconfigure(hardcore, text="HARDCORE MODE")
+        else:
+            self.itemconfigure(hardcore, text="")
+
+    def redraw_hardcore(self, color, m: TetrisModel):
+        tag = "move"
+        dots = self.find_withtag(tag)
+        for dot in dots:
+            self.delete(dot)
+        tag = "save"
+        dots = self.find_withtag(tag)
+        for dot in dots:
+            self.delete(dot)
+        for h in range(m.height):
+            for w in range(m.width):
+                if (m.grid[h] >> w) & 1:
+                    self.draw_tile(w, h, color, tag)
+
+    def game_over(self, score):
+        self.create_rectangle(STEP*5, self.winfo_height()/2-STEP*3,
+                              self.winfo_width()-STEP*5,
+                              self.winfo_height()/2+STEP,
+                              fill="#2f2f2f", width=1, tag="gameover")
+
+        self.create_text(self.winfo_width() / 2, self.winfo_height()/2-STEP,
+                         text="Game Over with Score {0}.".format(score), fill="white",
+                         font=("Arial", 5+STEP//2))
+
+
+class GameController():
+    def __init__(self, model, view, ai=False, hardcore=False):
+        self.model = model
+        self.view = view
+        self.ai = ai
+        self.hardcore = hardcore
+        self.next_color = "lightblue"
+        self.color = self.next_color
+        self.score = 0
+        self.nextX = self.model.width + 1
+        self.nextY = 1
+        self.start = datetime.now()
+        self.dt = "0:00:00"
+        self.new_tetris()
+
+    def update(self, save=False):
+        s = self.model.pieces[self.model.tetris_idx][self.model.shape_idx]
+        self.view.redraw_shape(self.model.moveX, self.model.moveY, self.color,
+                               s, "move", save)
+        self.view.draw_score(self.dt, self.score, self.model.moveX,
+                             self.model.moveY, self.model.tetris_idx, self.model.shape_idx)
+
+    def draw_hardcore(self):
+        self.view.redraw_hardcore("green2", self.model)
+        self.next_color = COLORS[random.randint(0, 7)]
+        self.view.redraw_shape(self.nextX, self.nextY, self.next_color,
+                               self.model.pieces[self.model.next_tetris][0], "next")
+        self.view.draw_score(self.dt, self.score, self.model.moveX,
+                             self.model.moveY, self.model.tetris_idx, self.model.shape_idx, True)
+
+    def on_key_pressed(self, e):
+        if not self.model.in_game:
+            return
+        key = e.keysym
+        # print("pressed", key)
+        ESCAPE_KEY = "Escape"
+        AI_KEY = ["a", "A"]
+        HARDCORE_KEY = ["h", "H"]
+        PAUSE_KEY = ["p", "P"]
+        LEFT_CURSOR_KEY = ["Left", "s", "S"]
+        RIGHT_CURSOR_KEY = ["Right", "f", "F"]
+        DOWN_CURSOR_KEY = ["Down", "d", "D"]
+        UP_CURSOR_KEY = ["Up", "j", "J", "e", "E"]
+        SPACE_KEY = "space"
+
+        if key in PAUSE_KEY:
+            self.model.pause_move = not self.model.pause_move
+        if key in LEFT_CURSOR_KEY and self.model.move(Direction.LEFT):
+            self.update()
+        if key in RIGHT_CURSOR_KEY and self.model.move(Direction.RIGHT):
+            self.update()
+        if key in DOWN_CURSOR_KEY and self.model.move(Direction.DOWN):
+            self.update()
+        if key in UP_CURSOR_KEY and self.model.rotate():
+            self.update()
+        if key in AI_KEY:
+            self.ai = not self.ai
+        if key in HARDCORE_KEY:
+            self.hardcore = not self.hardcore
+        if key == ESCAPE_KEY:
+            # self.game_over()
+            sys.exit(0)
+        if key == SPACE_KEY:
+            while self.model.move(Direction.DOWN):
+                self.update()
+
+    def on_timer(self):
+        if self.hardcore:
+            ts = int(time.time())
+            while self.model.in_game:
+                # 每秒打印一次, 只有这时才需要诊断信息
+                report = int(time.time()) != ts
+                answer = self.model.solve(diagnostics=report)  # 尝试解题
+                self.model.moveX = answer[1]
+                self.model.moveY = answer[2]
+                self.model.shape_idx = answer[3]
+                self.model.save()
+                melted = self.model.try_melt()
+                self.score += len(melted)
+                self.model.new_tetris()
+                if report:
+                    self.dt = str(datetime.now() - self.start).split(".")[0]
+                    nps = self.model.nodes / (datetime.now() - self.start).total_seconds()
+                    print(self.dt, "score:", self.score, "nodes/s: {:.0f}".format(nps), answer)
+                    if self.model.profile is not None:
+                        print(self.dt, self.model.profile)
+                    self.draw_hardcore()
+                    self.view.after(AI_DELAY, self.on_timer)
+                    break
+            if not self.model.in_game:
+                self.game_over()
+
+        elif self.model.in_game:
+            self.dt = str(datetime.now() - self.start).split(".")[0]
+            if not self.model.pause_move:
+                if self.model.move(Direction.DOWN):
+                    self.update()
+                else:
+                    self.update(save=True)
+                    self.model.save()
+                    self.try_melt()
+                    self.new_tetris()
+            if self.ai:
+                self.view.after(AI_DELAY, self.on_timer)
+            else:
+                self.view.after(DELAY, self.on_timer)
+        else:
+            self.game_over()
+
+    def new_tetris(self):
+        self.color = self.next_color
+        self.next_color = COLORS[random.randint(0, 7)]
+        self.model.new_tetris()
+        self.view.redraw_shape(self.model.moveX, self.model.moveY, self.color,
+                               self.model.pieces[self.model.tetris_idx][self.model.shape_idx], "move")
+        self.view.redraw_shape(self.nextX, self.nextY, self.next_color,
+                               self.model.pieces[self.model.next_tetris][0], "next")
+        if self.ai:  # 自动执行
+            answer = self.model.solve(diagnostics=True)  # 尝试解题
+            self.model.moveX = answer[1]
+            self.model.shape_idx = answer[3]
+            print(self.dt, "score:", self.score,
+                  self.model.tetris_idx, answer)
+
+    def try_melt(self):
+        melted = self.model.try_melt()
+        self.score += len(melted)
+        for h in melted:
+            self.view.melt_tile(h)
+
+    def game_over(self):
+        self.model.in_game = False
+        self.view.game_over(self.score)
+        if self.model.cache is not None:
+            print(self.model.cache)
+        if self.model.profile is not None:
+            print(self.model.profile)
+
+
+class TetrisGame(Frame):
+    def __init__(self, ai=False, hardcore=False, **options):
+        super().__init__()
+        self.master.title('TETRIS - 俄罗斯方块AI大作战')
+        model = new_model(**options)
+        view = GameView()
+        controller = GameController(model, view, ai, hardcore)
+        view.bind_all("<Key>", controller.on_key_pressed)
+        view.after(DELAY, controller.on_timer)
+        self.board = view
+        self.pack()
+
+
+def play(ai=False, hardcore=False, **options):
+    root = Tk()
+    TetrisGame(ai, hardcore, **options)
+    root.mainloop()
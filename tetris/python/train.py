@@ -1,14 +1,25 @@
-import random
+import os
+import sys
+import csv
+import json
+import math
 import time
+import pickle
+import random
+import getopt
+import queue
+import hashlib
+import tempfile
 import numpy as np
 import multiprocessing
-from functools import partial
 from typing import List, Tuple, Any
 from multiprocessing.pool import Pool
 
-# 从原始的 tetris.py 文件中导入必要的模块
-# 我们需要 TetrisModel 作为父类，以及 T, GRID_WIDTH, GRID_HEIGHT 等常量
-from tetris import TetrisModel, T, GRID_WIDTH, GRID_HEIGHT
+# 从不依赖 tkinter 的 tetris_core 中导入必要的模块, 工作进程启动时不必加载界面
+# 我们需要评估后端 BACKENDS，以及 GRID_WIDTH, GRID_HEIGHT 等常量
+from tetris_core import (TetrisModel, SolveCache, PieceBank, WeightedRandom, PhaseProfile,
+                         BACKENDS, GRID_WIDTH, GRID_HEIGHT)
+from lockstep import LockstepGames
 
 # --- 遗传算法的超参数 ---
 POPULATION_SIZE = 128  # 种群大小 (设为16线程的4倍，便于工作分配)
@@ -18,169 +29,181 @@ CROSSOVER_RATE = 0.8  # 交叉率
 NUM_GENERATIONS = 100  # 迭代多少代
 ELITISM_PERCENT = 0.1  # 保留多少比例的精英
 GAME_LIMIT = 60000 # 每局游戏最多放置的方块数
+SOLVE_CACHE_SIZE = 0  # 每个进程 solve() 结果缓存的条目数, 0 为不缓存
+LOOKAHEAD = 0  # 两步搜索(当前块+下一块)保留的候选数, 0 为只看当前块
+LOCKSTEP_GAMES = 0  # 每个进程用 LockstepGames 同时推进多少局, 0 为逐局运行
+BACKEND = "list"  # 逐局运行时的评估后端: list / incremental / bitboard / numpy
+GAME_REPEATS = 2  # 每个个体每代玩几局取平均
+# 同一代的所有个体玩相同的几局(共同随机数): 个体之间的差别不再混着
+# 方块序列的运气, 适应度的噪声小得多, GAME_REPEATS 可以相应减少
+COMMON_RANDOM_NUMBERS = True
+SEED = 0  # 第 g 代第 r 局的方块序列是 TetrisRandom(SEED + g * GAME_REPEATS + r)
+# False 时每一代都玩 SEED 开始的同一组局, 留下来的精英的成绩可以直接从
+# 适应度缓存里取, 代价是所有个体都只在这几局上比较
+RESEED_GAMES = True
+# 逐轮淘汰(successive halving): 先让所有个体只玩 RACE_BUDGET 块, 留下最好的
+# RACE_KEEP 比例, 幸存者下一轮玩 1/RACE_KEEP 倍的方块数, 直到只剩精英
+RACING = False
+RACE_BUDGET = 1000  # 第一轮每局放置的方块数
+RACE_KEEP = 0.5  # 每轮留下的比例
+# 玩过的局的结果按 (权重, 方块序列种子, 方块数上限) 记在这个文件里, 再遇到就不必重玩。
+# 默认的 RESEED_GAMES = True 下每代的局都不同, 留下来的精英也要重玩, 缓存只在
+# --resume 时省下中断那一代已经玩完的局; 文件却每局追加一行 (含停下时的局面),
+# 一直变大。所以默认不写, --checkpoint 和 --resume 时才用。
+# RESEED_GAMES = False 时即使不写文件也在内存里缓存, 精英不必重玩。
+FITNESS_CACHE_FILE = None
+# 每一代开始前把种群和随机数状态存到这个文件, train.py --resume 从这里接着训练。
+# 默认不保存, --checkpoint 时存为 train_checkpoint.pkl (同时打开 FITNESS_CACHE_FILE)
+CHECKPOINT_FILE = None
+WORKERS = None  # 工作进程数, None 为 CPU 核数
+# 长局切成每段最多 CHUNK_PIECES 块的任务, 玩完一段再排队接着玩下一段,
+# 几局特别长的游戏就不会拖在最后让其他核空等; 0 为每局一个任务
+CHUNK_PIECES = 0
+# 优化算法: ga 为轮盘赌遗传算法, cmaes 为 CMA-ES, cem 为交叉熵方法
+OPTIMIZER = "ga"
+CMA_SIGMA = 0.5  # CMA-ES 的初始步长
+CEM_ELITE = 0.2  # 交叉熵方法用最好的多少比例估计下一代的分布
+CEM_NOISE = 0.05  # 交叉熵方法每代加到方差上的噪声, 防止过早收敛
+TARGET_FITNESS = None  # 最好成绩第一次达到这个消行数时报告用了多少块, None 为不报告
+# 代理环境: 更窄或更矮的棋盘、S/Z 更多的方块分布 (sz 为 S 和 Z 合占的比例)、
+# 开局预置的垃圾行 (每行一个空格), 局很快就结束。设置时每代先在代理环境里
+# 玩一遍, 只有最好的 PROXY_KEEP 比例进入完整评估。排名是否可信用 proxy.py 检查。
+# 例: {"width": 8, "height": 16, "sz": 0.4, "garbage": 4}, None 为不用
+PROXY = None
+PROXY_KEEP = 0.25
+# 每代的统计 (方块数和速度、各工作进程的耗时、局长分布、solve 和其他开销、
+# 进程池空闲时间, PROFILE 时还有这一代各阶段的耗时) 追加到这个文件,
+# .csv 结尾为 CSV, 否则为 JSON lines; None 为不写
+TELEMETRY_FILE = None
+# 稳态遗传算法: 不分代, 一个个体评估完马上生下一个 (见 steady_state()); 不支持 --resume
+STEADY_STATE = False
+TOURNAMENT_SIZE = 3  # 稳态遗传算法锦标赛选择的参赛个数
+# 逐局运行时按阶段 (生成候选、落点、评估、save、try_melt) 抽样计时, 每代打印各进程累计的结果
+PROFILE = False
 
 # --- 步骤一：创建可训练的 Tetris 模型 ---
 
 
-class TrainableTetrisModel(TetrisModel):
+def new_trainable_model(weights: np.ndarray, randomizer=None, proxy: dict = None) -> TetrisModel:
     """
-    一个可训练的 Tetris 模型，它继承自原始的 TetrisModel,
-    但使用可变的权重进行评估。
+    一个可训练的 Tetris 模型：按 BACKEND 选一个评估后端，
+    六个特征由各后端共用的 features() 计算，只把权重换成我们自己的。
+    randomizer 是方块的来源，默认为进程共用的 TetrisRandom。
+    proxy 是代理环境的设置 (见 PROXY)，给出时按它的 width/height 建棋盘。
     """
-
-    def __init__(self, w: int, h: int, weights: np.ndarray) -> None:
-        # 调用父类的构造函数来初始化游戏板等
-        super().__init__(w, h)
-        # 存储我们自己的权重
-        self.weights = weights
-
-    def evaluate(self, grid: List[int], try_x: int, try_y: int, try_num: int) -> List:
-        """
-        重写(override)父类的评估函数。
-        这里的代码和父类完全一样，除了最后计算 score 的部分。
-        """
-        # --- 这部分代码完全复制自 TetrisModel.evaluate ---
-        LandingHeight = 0
-        RowTransitions = 0
-        ColumnTransitions = 0
-        NumberOfHoles = 0
-        WellSums = 0
-
-        melted = 0
-        h = self.height - 1
-        while h > 0:
-            if 1 << self.width <= grid[h] + 1:
-                melted += 1
-                for y in range(h, 0, -1):
-                    grid[y] = grid[y - 1]
-                h += 1
-            h -= 1
-
-        for y in range(self.height):
-            last_cell = 1
-            for x in range(self.width):
-                cell = (grid[y] >> x) & 1
-                if last_cell != cell:
-                    RowTransitions += 1
-                last_cell = cell
-            if cell == 0:
-                RowTransitions += 1
-
-        for x in range(self.width):
-            mark = 0
-            col_cells = 0
-            wells = 0
-            last_cell = 0
-            for y in range(self.height):
-                cell = (grid[y] >> x) & 1
-                if last_cell != cell:
-                    ColumnTransitions += 1
-                last_cell = cell
-                if x == 0:
-                    if cell == 0 and (grid[y] >> 1 & 1) == 1:
-                        wells += 1
-                    elif wells > 0:
-                        WellSums += (1 + wells) * wells / 2
-                        wells = 0
-                    if y >= self.height - 1:
-                        WellSums += (1 + wells) * wells / 2
-                        wells = 0
-                elif x == self.width - 1:
-                    if cell == 0 and (grid[y] >> x - 1 & 1) == 1:
-                        wells += 1
-                    elif wells > 0:
-                        WellSums += (1 + wells) * wells / 2
-                        wells = 0
-                    if y >= self.height - 1:
-                        WellSums += (1 + wells) * wells / 2
-                        wells = 0
-                else:
-                    if (
-                        cell == 0
-                        and (grid[y] >> x - 1 & 1) == 1
-                        and (grid[y] >> x + 1 & 1) == 1
-                    ):
-                        wells += 1
-                    elif wells > 0:
-                        WellSums += (1 + wells) * wells / 2
-                        wells = 0
-                    if y >= self.height - 1:
-                        WellSums += (1 + wells) * wells / 2
-                        wells = 0
-                if cell == 1:
-                    col_cells += 1
-                    if mark == 0:
-                        mark = y
-            if col_cells > 0:
-                NumberOfHoles += self.height - mark - col_cells
-            if last_cell == 0:
-                ColumnTransitions += 1
-
-        s = T[self.tetris_idx][try_num]
-        lh = 20 - (try_y + s["height"])
-        LandingHeight = lh + (s["height"] - 1) / 2
-        # --- 代码复制结束 ---
-
-        # 唯一的改动：使用我们自己的权重来计算分数
-        score = (
-            self.weights[0] * LandingHeight
-            + self.weights[1] * melted
-            + self.weights[2] * RowTransitions
-            + self.weights[3] * ColumnTransitions
-            + self.weights[4] * NumberOfHoles
-            + self.weights[5] * WellSums
-        )
-
-        # 返回的结果和父类保持一致
-        return [
-            score,
-            try_x,
-            try_y,
-            try_num,
-            (
-                self.count,
-                lh,
-                s["height"],
-                LandingHeight,
-                melted,
-                RowTransitions,
-                ColumnTransitions,
-                NumberOfHoles,
-                WellSums,
-            ),
-        ]
+    proxy = proxy or {}
+    model = BACKENDS[BACKEND](proxy.get("width", GRID_WIDTH), proxy.get("height", GRID_HEIGHT),
+                              randomizer)
+    # 转成普通 float 的元组: 可以作为缓存键的一部分, 也比 numpy 标量算得快
+    model.weights = tuple(weights.tolist())
+    return model
 
 
 # --- 步骤二：定义游戏运行和遗传算法函数 ---
 
 
-def run_game_for_training(weights: np.ndarray) -> int:
-    """为遗传算法运行一局无界面的游戏，返回消行数。"""
+_solve_cache = None
+
+
+def solve_cache() -> SolveCache:
+    """每个工作进程共用一个 solve() 缓存"""
+    global _solve_cache
+    if _solve_cache is None:
+        _solve_cache = SolveCache(SOLVE_CACHE_SIZE)
+    return _solve_cache
+
+
+def proxy_piece_weights(proxy: dict):
+    """代理环境各方块的相对概率, S 和 Z 合占 proxy["sz"], 没有设置时为 None (7x7 袋)"""
+    if proxy is None or "sz" not in proxy:
+        return None
+    sz = proxy["sz"]
+    return [(1 - sz) / 5] * 5 + [sz / 2] * 2  # T 里最后两个是 Z 和 S
+
+
+def garbage_rows(proxy: dict, game: int, width: int) -> List[int]:
+    """代理环境第 game 局开局时底部的垃圾行，每行随机一个空格。
+    由 proxy["seed"] 和 game 决定，同一局所有个体遇到的一样;
+    没有 proxy["seed"] 时 (不用共同随机数) 每局都随机"""
+    seed = proxy.get("seed")
+    rng = random.Random(None if seed is None else seed * 7919 + game)
+    full = (1 << width) - 1
+    return [full & ~(1 << rng.randrange(width)) for _ in range(proxy.get("garbage", 0))]
+
+
+def game_state(model: TetrisModel, lines: int, pieces: int) -> dict:
+    """一局停下时的局面，race 下一轮从这里接着玩"""
+    return {"grid": [*model.grid], "tetris_idx": model.tetris_idx,
+            "next_tetris": model.next_tetris, "in_game": model.in_game,
+            "lines": lines, "pieces": pieces,
+            # 方块序列库里已经取到第几块, 共用的 TetrisRandom 没有这一项
+            "index": getattr(model.randomizer, "index", None)}
+
+
+def run_game_for_training(weights: np.ndarray, stats: dict = None, randomizer=None,
+                          limit: int = None, state: dict = None, proxy: dict = None,
+                          game: int = 0) -> int:
+    """为遗传算法运行一局无界面的游戏，最多放置 limit (默认 GAME_LIMIT) 块，返回消行数。
+    state 是这局上次停下时的 game_state()，传入时从那里接着玩。
+    proxy 是代理环境的设置，game 是第几局 (决定垃圾行)。
+    传入 stats 时把搜索过的节点数、放置的方块数和 solve() 的耗时累加到
+    stats["nodes"], stats["pieces"], stats["solve_seconds"]，停下时的局面放在 stats["states"]，
+    PROFILE 时各阶段的计时合并到 stats["profile"]。"""
     lines_cleared = 0
     # 使用我们创建的可训练模型，并传入权重
-    model = TrainableTetrisModel(GRID_WIDTH, GRID_HEIGHT, weights)
+    model = new_trainable_model(weights, randomizer, proxy)
+    model.lookahead = LOOKAHEAD
+    if SOLVE_CACHE_SIZE:
+        model.cache = solve_cache()
+    if PROFILE:
+        PhaseProfile().attach(model)
+
+    pieces = 0
+    if state is not None:
+        model.grid = [*state["grid"]]
+        model.tetris_idx = state["tetris_idx"]
+        model.next_tetris = state["next_tetris"]
+        model.in_game = state["in_game"]
+        model.count = state["pieces"] + 1
+        if state["index"] is not None:
+            model.randomizer.index = state["index"]
+        lines_cleared = state["lines"]
+        pieces = state["pieces"]
+    elif proxy and proxy.get("garbage"):
+        garbage = garbage_rows(proxy, game, model.width)
+        model.grid = [0] * (model.height - len(garbage)) + garbage
 
-    for _ in range(GAME_LIMIT):
+    placed = 0
+    solve_seconds = 0.0
+    for _ in range((limit or GAME_LIMIT) - pieces):
         if not model.in_game:
             break
+        placed += 1
 
         model.new_tetris()
-        # model.solve() 会自动调用我们重写的 evaluate 方法
+        # model.solve() 会用模型上的权重给每个落点打分
+        start = time.perf_counter()
         answer = model.solve()
+        solve_seconds += time.perf_counter() - start
 
         model.moveX = answer[1]
         model.shape_idx = answer[3]
 
-        # 模拟方块下落
-        y = 0
-        while not model.collided(model.moveX, y + 1, model.shape_idx):
-            y += 1
-        model.moveY = y
+        # solve() 已经按高度轮廓(skyline)算出了落点，不必再逐行下落
+        model.moveY = max(answer[2], 0)
 
         model.save()
         melted = model.try_melt()
         lines_cleared += len(melted)
 
+    if stats is not None:
+        stats["nodes"] = stats.get("nodes", 0) + model.nodes
+        stats["pieces"] = stats.get("pieces", 0) + placed
+        stats["solve_seconds"] = stats.get("solve_seconds", 0.0) + solve_seconds
+        stats.setdefault("states", []).append(
+            game_state(model, lines_cleared, pieces + placed))
+        if model.profile is not None:
+            stats.setdefault("profile", PhaseProfile()).merge(model.profile.stats())
     return lines_cleared
 
 
@@ -189,13 +212,433 @@ def initialize_population() -> List[np.ndarray]:
     return [np.random.uniform(-1.0, 1.0, NUM_WEIGHTS) for _ in range(POPULATION_SIZE)]
 
 
-def calculate_fitness_parallel(population: List[np.ndarray], pool: Pool) -> np.ndarray:
-    """使用多进程并行计算适应度（接收一个已存在的pool）"""
-    # 运行两次游戏取平均值，使分数更稳定
-    scores1 = pool.map(run_game_for_training, population)
-    scores2 = pool.map(run_game_for_training, population)
-    fitness_scores = (np.array(scores1) + np.array(scores2)) / 2
-    return fitness_scores
+# 主进程里汇总的各工作进程计数：缓存命中情况、搜索节点数、玩完的局数和游戏耗时
+# (其中 solve() 的耗时另记, LockstepGames 不单独计 solve)
+worker_totals = {"hits": 0, "misses": 0, "evictions": 0, "nodes": 0, "pieces": 0,
+                 "games": 0, "seconds": 0.0, "solve_seconds": 0.0}
+# 上一次 calculate_fitness_parallel() 各工作进程 (pid) 忙的秒数和放置的方块数、
+# 玩完的各局的长度 (方块数) 和总的秒数
+worker_busy = {}
+worker_pieces = {}
+game_lengths = []
+fitness_seconds = 0.0
+# PROFILE 时各工作进程带回的分阶段计时
+phase_totals = PhaseProfile()
+
+
+class FitnessCache(object):
+    """
+    玩过的局的结果: 键是权重、方块序列种子和方块数上限等的哈希, 值是
+    [消行数, 停下时的局面]。方块序列相同时同一个键的局每次都玩得一样,
+    所以不必重玩。新结果逐行追加到 path 的 JSON lines 文件, 训练中途退出
+    也不会丢, 下次启动时读回来。
+    """
+
+    def __init__(self, path: str = None) -> None:
+        self.path = path
+        self.results = {}
+        self.hits = 0
+        self.added = 0
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        key, value = json.loads(line)
+                    except ValueError:
+                        continue  # 上次退出时最后一行可能只写了一半
+                    self.results[key] = value
+
+    def key(self, weights: np.ndarray, seed: int, limit: int = None, proxy: dict = None) -> str:
+        h = hashlib.sha1(np.asarray(weights, dtype=float).tobytes())
+        h.update(repr((seed, limit or GAME_LIMIT, LOOKAHEAD, GRID_WIDTH, GRID_HEIGHT)).encode())
+        if proxy:
+            h.update(repr(sorted(proxy.items())).encode())
+        return h.hexdigest()
+
+    def get(self, key: str):
+        value = self.results.get(key)
+        if value is not None:
+            self.hits += 1
+        return value
+
+    def put(self, key: str, lines: int, state: dict) -> None:
+        self.results[key] = [lines, state]
+        self.added += 1
+        if self.path:
+            with open(self.path, "a") as f:
+                f.write(json.dumps([key, [lines, state]]) + "\n")
+
+    def __str__(self) -> str:
+        return f"Fitness Cache: {self.hits} hits, {self.added} new, {len(self.results)} stored"
+
+
+# 主进程里的适应度缓存, main() 按 FITNESS_CACHE_FILE 创建
+fitness_cache = None
+
+
+def bank_randomizer(bank: str, game: int):
+    """方块序列库 bank 中第 game 局的方块来源, 没有序列库时为 None"""
+    if bank is None:
+        return None
+    return PieceBank.open(bank).randomizer(game)
+
+
+def play_for_fitness(weights: np.ndarray, state: dict = None, bank: str = None,
+                     game: int = 0, limit: int = None, proxy: dict = None) -> Tuple[int, dict]:
+    """工作进程执行：玩一局，同时带回这局的计数。
+    bank 是方块序列库的文件名，所有进程都从里面取第 game 局的方块。
+    proxy 给出时在这个代理环境里玩"""
+    stats = {}
+    if SOLVE_CACHE_SIZE:
+        before = solve_cache().stats()
+    randomizer = bank_randomizer(bank, game)
+    piece_weights = proxy_piece_weights(proxy)
+    if randomizer is None and piece_weights is not None:
+        # 没有方块序列库 (不用共同随机数) 时, 代理环境的方块分布由每局自己的生成器抽
+        randomizer = WeightedRandom(piece_weights, random.randrange(1 << 32))
+    start = time.perf_counter()
+    lines = run_game_for_training(weights, stats, randomizer, limit, state, proxy, game)
+    stats["seconds"] = time.perf_counter() - start
+    if SOLVE_CACHE_SIZE:
+        after = solve_cache().stats()
+        for k in ("hits", "misses", "evictions"):
+            stats[k] = after[k] - before[k]
+    return lines, stats
+
+
+def play_lockstep(chunk: List[np.ndarray], states: List[dict] = None, bank: str = None,
+                  game: int = 0, limit: int = None) -> Tuple[List[int], dict]:
+    """工作进程执行：一批权重各玩一局，所有游戏同步推进"""
+    start = time.perf_counter()
+    randoms = None
+    if bank is not None:
+        randoms = [bank_randomizer(bank, game) for _ in chunk]
+    games = LockstepGames(chunk, randoms, limit=limit or GAME_LIMIT)
+    for g, state in enumerate(states or []):
+        if state is not None:
+            games.resume(g, state)
+    before = int(games.pieces.sum())
+    lines = games.run().tolist()
+    return lines, {"pieces": int(games.pieces.sum()) - before,
+                   "states": [games.state(g) for g in range(len(chunk))],
+                   "seconds": time.perf_counter() - start}
+
+
+def play_task(task: tuple) -> tuple:
+    """工作进程执行：task 是 (game, 个体序号, 权重, 开始局面, bank, limit, lockstep, proxy)，
+    逐局运行时只有一个个体，lockstep 为 True 时是用 LockstepGames 同时玩的一批"""
+    game, group, weights, starts, bank, limit, lockstep, proxy = task
+    if lockstep:
+        lines, stats = play_lockstep(weights, starts, bank, game, limit)
+    else:
+        lines, stats = play_for_fitness(weights[0], starts[0], bank, game, limit, proxy)
+        lines = [lines]
+    stats["worker"] = os.getpid()
+    return game, group, lines, stats
+
+
+def finished(state: dict, limit: int) -> bool:
+    return not state["in_game"] or state["pieces"] >= limit
+
+
+def add_worker_stats(stats: dict) -> None:
+    """一个任务带回的计数加到 worker_totals 和它的工作进程名下"""
+    worker = stats.pop("worker")
+    profile = stats.pop("profile", None)
+    if profile is not None:
+        phase_totals.merge(profile.stats())
+    worker_busy[worker] = worker_busy.get(worker, 0.0) + stats["seconds"]
+    worker_pieces[worker] = worker_pieces.get(worker, 0) + stats["pieces"]
+    for k, v in stats.items():
+        worker_totals[k] += v
+
+
+def play_games(population: List[np.ndarray], pool: Pool, bank: str, seed: int = None,
+               limit: int = None, states: List[List[dict]] = None,
+               proxy: dict = None) -> np.ndarray:
+    """
+    每个个体玩 GAME_REPEATS 局，返回平均消行数。seed 是第一局方块序列的种子
+    (没有方块序列库时为 None)，给出时先查 fitness_cache，只玩没玩过的。
+    states[game] 是各个体第 game 局上次停下时的局面 (None 为从头开始)，
+    传入时接着玩，并换成这次停下时的局面。
+    所有局一次排进进程池，谁先玩完先处理谁；CHUNK_PIECES 不为 0 时
+    长局分段玩，每段玩完把接下来的一段重新排队。
+    proxy 给出时在这个代理环境里逐局玩 (不用 LockstepGames)。
+    """
+    limit = limit or GAME_LIMIT
+    n = len(population)
+    lines = np.zeros((GAME_REPEATS, n), dtype=int)
+    ends = [[None] * n for _ in range(GAME_REPEATS)]
+    starts = states or [[None] * n for _ in range(GAME_REPEATS)]
+    keys = {}
+    todo = []
+    for game in range(GAME_REPEATS):
+        for i in range(n):
+            if seed is not None and fitness_cache is not None:
+                keys[game, i] = fitness_cache.key(population[i], seed + game, limit, proxy)
+                hit = fitness_cache.get(keys[game, i])
+                if hit is not None:
+                    lines[game, i], ends[game][i] = hit
+                    continue
+            todo.append((game, i))
+
+    done = queue.Queue()
+    pending = 0
+
+    def submit(game: int, group: List[int], group_starts: List[dict]) -> None:
+        nonlocal pending
+        stop = limit
+        if CHUNK_PIECES:
+            stop = min(limit, max(s["pieces"] if s else 0 for s in group_starts) + CHUNK_PIECES)
+        task = (game, group, [population[i] for i in group], group_starts, bank, stop,
+                lockstep, proxy)
+        pool.apply_async(play_task, (task,), callback=done.put, error_callback=done.put)
+        pending += 1
+
+    lockstep = bool(LOCKSTEP_GAMES) and not proxy
+    size = LOCKSTEP_GAMES if lockstep else 1
+    for game in range(GAME_REPEATS):
+        indices = [i for g, i in todo if g == game]
+        for k in range(0, len(indices), size):
+            group = indices[k:k + size]
+            submit(game, group, [starts[game][i] for i in group])
+
+    while pending:
+        result = done.get()
+        pending -= 1
+        if isinstance(result, Exception):
+            raise result
+        game, group, played, stats = result
+        unfinished = []
+        for i, count, state in zip(group, played, stats.pop("states")):
+            if not finished(state, limit):
+                unfinished.append(i)
+                starts[game][i] = state
+                continue
+            lines[game, i] = count
+            ends[game][i] = state
+            if finished(state, GAME_LIMIT):
+                game_lengths.append(state["pieces"])
+                worker_totals["games"] += 1
+            if (game, i) in keys:
+                fitness_cache.put(keys[game, i], count, state)
+        if unfinished:
+            submit(game, unfinished, [starts[game][i] for i in unfinished])
+        add_worker_stats(stats)
+
+    if states is not None:
+        for game in range(GAME_REPEATS):
+            states[game][:] = ends[game]
+    return lines.mean(axis=0)
+
+
+def race(population: List[np.ndarray], pool: Pool, bank: str, seed: int = None) -> np.ndarray:
+    """
+    逐轮淘汰：所有个体先玩 RACE_BUDGET 块，按分数留下 RACE_KEEP 比例，
+    幸存者从上一轮停下的地方接着玩更多的块，直到只剩精英，精英最后玩满 GAME_LIMIT。
+    被淘汰的个体保留淘汰那一轮的分数：接着玩消行只多不少，淘汰不会颠倒排名，
+    总的方块数也不会超过每个个体都玩满的时候。
+    """
+    num_elites = max(1, int(ELITISM_PERCENT * POPULATION_SIZE))
+    fitness = np.zeros(len(population))
+    states = [[None] * len(population) for _ in range(GAME_REPEATS)]
+    alive = np.arange(len(population))
+    budget = min(RACE_BUDGET, GAME_LIMIT)
+    while True:
+        if len(alive) <= num_elites:
+            budget = GAME_LIMIT
+        running = [[states[game][i] for i in alive] for game in range(GAME_REPEATS)]
+        fitness[alive] = play_games([population[i] for i in alive], pool, bank, seed,
+                                    budget, running)
+        for game in range(GAME_REPEATS):
+            for i, state in zip(alive, running[game]):
+                states[game][i] = state
+        if budget >= GAME_LIMIT:
+            break
+        keep = max(num_elites, math.ceil(len(alive) * RACE_KEEP))
+        alive = alive[np.argsort(-fitness[alive], kind="stable")[:keep]]
+        budget = min(GAME_LIMIT, int(budget / RACE_KEEP))
+    return fitness
+
+
+def generation_seed(generation: int) -> int:
+    """第 generation 代第一局方块序列的种子"""
+    return SEED + generation * GAME_REPEATS if RESEED_GAMES else SEED
+
+
+def new_bank(seed: int, piece_weights=None) -> str:
+    """这一代的 GAME_REPEATS 局方块序列写进一个临时文件, 各进程以只读内存映射共用,
+    返回文件名, 用完由调用者删除"""
+    fd, bank = tempfile.mkstemp(prefix="tetris-pieces-", suffix=".npy")
+    os.close(fd)
+    # 开局时 TetrisModel 先抽一块, 之后每放一块再抽一块
+    PieceBank.create(bank, GAME_REPEATS, GAME_LIMIT + 1, seed, piece_weights)
+    return bank
+
+
+def proxy_fitness(population: List[np.ndarray], pool: Pool, generation: int = 0,
+                  proxy: dict = None) -> np.ndarray:
+    """在代理环境 proxy (默认 PROXY) 里每个个体玩 GAME_REPEATS 局的平均消行数"""
+    proxy = dict(proxy or PROXY)
+    bank = None
+    seed = None
+    if COMMON_RANDOM_NUMBERS:
+        seed = generation_seed(generation)
+        proxy["seed"] = seed  # 垃圾行也按这一代的种子生成
+        bank = new_bank(seed, proxy_piece_weights(proxy))
+    try:
+        return play_games(population, pool, bank, seed, proxy=proxy)
+    finally:
+        if bank is not None:
+            os.remove(bank)
+
+
+def calculate_fitness_parallel(population: List[np.ndarray], pool: Pool,
+                               generation: int = 0, racing: bool = None,
+                               proxy: bool = None) -> np.ndarray:
+    """使用多进程并行计算适应度（接收一个已存在的pool）
+    racing 为 True 时逐轮淘汰, 默认按 RACING 设置。
+    proxy 为 True 时先在代理环境 PROXY 里筛选, 默认按是否设置了 PROXY"""
+    global fitness_seconds
+    worker_busy.clear()
+    worker_pieces.clear()
+    game_lengths.clear()
+    start = time.perf_counter()
+    try:
+        if not (PROXY and (proxy is None or proxy)):
+            return full_fitness(population, pool, generation, racing)
+        # 代理环境里最好的 PROXY_KEEP 比例 (至少保留精英数) 进入完整评估,
+        # 其余的保留代理环境的分数, 但不超过进入完整评估的最低分
+        scores = proxy_fitness(population, pool, generation)
+        num_elites = max(1, int(ELITISM_PERCENT * POPULATION_SIZE))
+        keep = max(num_elites, math.ceil(len(population) * PROXY_KEEP))
+        order = np.argsort(-scores, kind="stable")
+        kept, dropped = order[:keep], order[keep:]
+        fitness = np.zeros(len(population))
+        fitness[kept] = full_fitness([population[i] for i in kept], pool, generation, racing)
+        fitness[dropped] = np.minimum(scores[dropped], fitness[kept].min())
+        return fitness
+    finally:
+        fitness_seconds = time.perf_counter() - start
+
+
+def full_fitness(population: List[np.ndarray], pool: Pool, generation: int = 0,
+                 racing: bool = None) -> np.ndarray:
+    """在完整的棋盘上按 RACING (或 racing) 逐轮淘汰或玩满 GAME_REPEATS 局"""
+    bank = None
+    seed = None
+    if COMMON_RANDOM_NUMBERS:
+        seed = generation_seed(generation)
+        bank = new_bank(seed)
+    try:
+        if RACING if racing is None else racing:
+            return race(population, pool, bank, seed)
+        # 运行多局游戏取平均值，使分数更稳定
+        return play_games(population, pool, bank, seed)
+    finally:
+        if bank is not None:
+            os.remove(bank)
+
+
+def cache_report() -> str:
+    lookups = worker_totals["hits"] + worker_totals["misses"]
+    rate = worker_totals["hits"] / lookups if lookups else 0
+    return "Solve Cache: {hits} hits, {misses} misses, {evictions} evictions".format(
+        **worker_totals) + f", hit rate {rate:.1%}"
+
+
+def utilization_report() -> str:
+    """上一次适应度计算中工作进程忙的时间占比，没分到任务的进程算作 0"""
+    workers = WORKERS or os.cpu_count()
+    if not fitness_seconds:
+        return f"Workers: {workers}"
+    busy = sorted(worker_busy.values(), reverse=True) + [0.0] * (workers - len(worker_busy))
+    rates = [b / fitness_seconds for b in busy[:workers]]
+    return (f"Workers: {workers}, utilization {sum(rates) / workers:.1%} "
+            f"(min {min(rates):.1%}, max {max(rates):.1%})")
+
+
+def phase_delta(before: dict) -> dict:
+    """before (phase_totals.stats() 的结果) 以来各阶段的调用次数和估计的秒数,
+    展开成 solve_calls、solve_seconds 这样的一层, CSV 里每个一列"""
+    after = phase_totals.stats()
+    delta = {"elapsed": after["elapsed"] - before["elapsed"]}
+    for name in PhaseProfile.NAMES:
+        calls = after[name]["calls"] - before[name]["calls"]
+        sampled = after[name]["sampled"] - before[name]["sampled"]
+        sampled_seconds = after[name]["sampled_seconds"] - before[name]["sampled_seconds"]
+        delta[f"{name}_calls"] = calls
+        delta[f"{name}_seconds"] = sampled_seconds / sampled * calls if sampled else 0.0
+    return delta
+
+
+def telemetry(generation: int, seconds: float, before: dict, fitness: np.ndarray,
+              best_weights: np.ndarray, elapsed: float = None, phases: dict = None) -> dict:
+    """第 generation 代的统计。seconds 是这一代的总耗时，before 是这一代
+    开始时 worker_totals 的副本，各工作进程随结果带回的计数由此相减得出。
+    elapsed 是训练开始以来的秒数。PROFILE 时 phases 是这一代开始时的
+    phase_totals.stats(), 记录里加上这一代各阶段的耗时"""
+    delta = {k: worker_totals[k] - before[k] for k in worker_totals}
+    workers = WORKERS or os.cpu_count()
+    busy = sum(worker_busy.values())
+    lengths = np.array(game_lengths or [0])
+    rates = [worker_pieces[w] / worker_busy[w] for w in worker_busy if worker_busy[w]] or [0]
+    record = {
+        "generation": generation + 1, "time": time.time(),
+        "optimizer": "steady" if STEADY_STATE else OPTIMIZER,
+        "elapsed": elapsed, "seconds": seconds, "fitness_seconds": fitness_seconds,
+        "pieces": delta["pieces"], "pieces_per_second": delta["pieces"] / seconds,
+        "games": delta["games"], "games_per_second": delta["games"] / seconds,
+        # 工作进程的时间: solve() 里的和其余的 (建模型、落子、消行、取方块等)
+        "worker_seconds": delta["seconds"], "solve_seconds": delta["solve_seconds"],
+        "overhead_seconds": delta["seconds"] - delta["solve_seconds"],
+        "idle_seconds": workers * fitness_seconds - busy,
+        "utilization": busy / (workers * fitness_seconds) if fitness_seconds else 0,
+        "worker_pieces_per_second": {"min": min(rates), "mean": float(np.mean(rates)),
+                                     "max": max(rates)},
+        "game_length": {"min": int(lengths.min()), "mean": float(lengths.mean()),
+                        "p50": float(np.percentile(lengths, 50)),
+                        "p90": float(np.percentile(lengths, 90)), "max": int(lengths.max())},
+        "best_fitness": float(np.max(fitness)), "mean_fitness": float(np.mean(fitness)),
+        "best_weights": best_weights.tolist(),
+        "workers": {str(w): {"seconds": worker_busy[w], "pieces": worker_pieces[w]}
+                    for w in worker_busy},
+    }
+    if phases is not None:
+        record["phases"] = phase_delta(phases)
+    return record
+
+
+def write_telemetry(record: dict, path: str = None) -> None:
+    """record 追加到 path (默认 TELEMETRY_FILE)。CSV 每个字段一列, 嵌套的统计
+    展开成 game_length_p50 这样的列, 各工作进程的明细只在 JSON lines 里有"""
+    path = path or TELEMETRY_FILE
+    if not path.endswith(".csv"):
+        with open(path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        return
+    row = {}
+    for k, v in record.items():
+        if k == "workers":
+            continue
+        if isinstance(v, dict):
+            row.update((f"{k}_{name}", value) for name, value in v.items())
+        elif isinstance(v, list):
+            row[k] = " ".join(repr(x) for x in v)
+        else:
+            row[k] = v
+    new = not os.path.exists(path) or os.path.getsize(path) == 0
+    with open(path, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(row))
+        if new:
+            writer.writeheader()
+        writer.writerow(row)
+
+
+def search_report() -> str:
+    seconds = worker_totals["seconds"]
+    rate = worker_totals["nodes"] / seconds if seconds else 0
+    return f"Search: {worker_totals['nodes']} nodes, {rate:.0f} nodes/s per worker"
 
 
 def selection(population: List[np.ndarray], fitness_scores: np.ndarray) -> List[np.ndarray]:
@@ -222,68 +665,436 @@ def selection(population: List[np.ndarray], fitness_scores: np.ndarray) -> List[
     while len(next_generation) < POPULATION_SIZE:
         # 改变选择策略：使用轮盘赌选择，从整个种群中根据适应度按比例选择父母
         parent1, parent2 = random.choices(population, weights=fitness_weights, k=2)
-        
-        # 交叉
-        if random.random() < CROSSOVER_RATE:
-            point = random.randint(1, NUM_WEIGHTS - 1)
-            child = np.concatenate([parent1[:point], parent2[point:]])
-        else:
-            child = random.choice([parent1, parent2]).copy()
-            
-        # 变异
-        for i in range(NUM_WEIGHTS):
-            if random.random() < MUTATION_RATE:
-                # 加大变异力度：扩大变异范围
-                child[i] += np.random.uniform(-0.4, 0.4)
-        
-        next_generation.append(child)
+        next_generation.append(breed(parent1, parent2))
         
     return next_generation
 
 
-# --- 步骤三：主训练循环 ---
+def breed(parent1: np.ndarray, parent2: np.ndarray) -> np.ndarray:
+    """两个父母交叉、变异生一个孩子"""
+    # 交叉
+    if random.random() < CROSSOVER_RATE:
+        point = random.randint(1, NUM_WEIGHTS - 1)
+        child = np.concatenate([parent1[:point], parent2[point:]])
+    else:
+        child = random.choice([parent1, parent2]).copy()
 
+    # 变异
+    for i in range(NUM_WEIGHTS):
+        if random.random() < MUTATION_RATE:
+            # 加大变异力度：扩大变异范围
+            child[i] += np.random.uniform(-0.4, 0.4)
+    return child
 
-def main() -> None:
-    # 设置多进程启动方式，兼容不同操作系统
+
+def tournament(scored: List[Tuple[float, np.ndarray]]) -> np.ndarray:
+    """锦标赛选择: 从 (适应度, 权重) 中随机取 TOURNAMENT_SIZE 个, 返回最好的权重"""
+    entrants = random.sample(scored, min(TOURNAMENT_SIZE, len(scored)))
+    return max(entrants, key=lambda entry: entry[0])[1]
+
+
+def steady_state(pool: Pool, evaluations: int = None) -> List[Tuple[float, np.ndarray]]:
+    """
+    稳态遗传算法: 没有代的界限, 一个个体的 GAME_REPEATS 局一玩完就放进种群
+    (满 POPULATION_SIZE 后替换最差的, 比最差的还差就丢掉), 马上用锦标赛选择
+    从已评估的种群里生一个孩子补上, 进程池里一直有 2 倍工作进程数的个体在玩。
+    总共评估 evaluations (默认 NUM_GENERATIONS * POPULATION_SIZE) 个个体,
+    和按代训练的计算量一样; 每评估 POPULATION_SIZE 个报告一次, 格式和按代训练的相同。
+    每 POPULATION_SIZE 个是一个窗口, 第 w 个窗口玩第 w 代的那几局; RESEED_GAMES 时
+    换窗口后种群里的个体在新的局上重新评分, 只在某几局上运气好的个体不会一直留在最前面,
+    还在玩旧局的孩子也改玩新局 (重新评分不算在 evaluations 里)。返回最后的种群, 从好到差。
+    """
+    global fitness_seconds
+    evaluations = evaluations or NUM_GENERATIONS * POPULATION_SIZE
+    slots = 2 * (WORKERS or os.cpu_count())
+    window = 0
+    seed = None
+    banks = {}  # 种子 -> 方块序列库, 没有个体再玩这几局时删掉
+    if COMMON_RANDOM_NUMBERS:
+        seed = generation_seed(window)
+        banks[seed] = new_bank(seed)
+    newcomers = initialize_population()
+    scored = []
+    # 个体编号 -> [权重, 各局消行数, 各局的缓存键, 种子, 是否是种群里的个体重新评分]
+    playing = {}
+    submitted = 0
+    rescored = 0
+    evaluated = 0
+    reported = 0
+    done = queue.Queue()
+
+    def play(number: int, weights: np.ndarray, rescoring: bool) -> None:
+        """在当前窗口的几局上评估 weights"""
+        keys = [None] * GAME_REPEATS
+        playing[number] = [weights, [None] * GAME_REPEATS, keys, seed, rescoring]
+        for game in range(GAME_REPEATS):
+            if seed is not None and fitness_cache is not None:
+                keys[game] = fitness_cache.key(weights, seed + game)
+                hit = fitness_cache.get(keys[game])
+                if hit is not None:
+                    done.put((game, [number], [hit[0]], None))
+                    continue
+            task = (game, [number], [weights], [None], banks.get(seed), GAME_LIMIT, False, None)
+            pool.apply_async(play_task, (task,), callback=done.put, error_callback=done.put)
+
+    def dispatch() -> bool:
+        """开始评估一个新个体, 种群里还不够两个可以当父母的时候返回 False"""
+        nonlocal submitted
+        if newcomers:
+            weights = newcomers.pop()
+        elif len(scored) >= 2:
+            weights = breed(tournament(scored), tournament(scored))
+        else:
+            return False
+        play(submitted, weights, False)
+        submitted += 1
+        return True
+
+    def refill() -> None:
+        while submitted < evaluations and len(playing) < slots and dispatch():
+            pass
+
+    def next_window() -> None:
+        """换到下一个窗口的几局, 种群里的个体都在新的局上重新评分"""
+        nonlocal window, seed, rescored
+        window += 1
+        if COMMON_RANDOM_NUMBERS:
+            seed = generation_seed(window)
+            banks[seed] = new_bank(seed)
+        for _, weights in scored:
+            rescored += 1
+            play(-rescored, weights, True)  # 负的编号, 不和孩子的重复
+
+    start_time = time.monotonic()
+    window_time = start_time
+    window_totals = dict(worker_totals)
+    window_phases = phase_totals.stats()
+    reached = False
     try:
-        multiprocessing.set_start_method("fork", force=True)
-    except RuntimeError:
-        pass  # 'fork' might already be set
+        refill()
+        while playing:
+            result = done.get()
+            if isinstance(result, Exception):
+                raise result
+            game, (number,), (lines,), stats = result
+            weights, scores, keys, played_seed, rescoring = playing[number]
+            if stats is not None:
+                state = stats.pop("states")[0]
+                if keys[game] is not None:
+                    fitness_cache.put(keys[game], lines, state)
+                game_lengths.append(state["pieces"])
+                worker_totals["games"] += 1
+                add_worker_stats(stats)
+            scores[game] = lines
+            if None in scores:
+                continue
+            del playing[number]
+            for old in [s for s in banks if s != seed]:
+                if all(entry[3] != old for entry in playing.values()):
+                    os.remove(banks.pop(old))
+            fitness = float(np.mean(scores))
+            counted = False
+            if rescoring:
+                # 等重新评分的时候可能已经被更好的孩子替换掉了
+                for i, (_, survivor) in enumerate(scored):
+                    if survivor is weights:
+                        scored[i] = (fitness, weights)
+            elif played_seed != seed:
+                # 开始玩的时候还是上一个窗口, 在这个窗口的局上重玩才能和种群比较
+                play(number, weights, False)
+            else:
+                evaluated += 1
+                counted = True
+                if len(scored) < POPULATION_SIZE:
+                    scored.append((fitness, weights))
+                else:
+                    worst = min(range(len(scored)), key=lambda i: scored[i][0])
+                    if fitness > scored[worst][0]:
+                        scored[worst] = (fitness, weights)
+            refill()
+
+            if (counted and evaluated % POPULATION_SIZE == 0
+                    or not playing and reported < evaluated):
+                reported = evaluated
+                now = time.monotonic()
+                fitness_seconds = now - window_time
+                best_fitness, best_weights = max(scored, key=lambda entry: entry[0])
+                pieces = worker_totals["pieces"] - window_totals["pieces"]
+                print(f"\n--- Evaluations {evaluated}/{evaluations} ---")
+                print(f"Window Time: {fitness_seconds:.2f}s, "
+                      f"Pieces: {pieces} ({pieces / fitness_seconds:.0f} pieces/s)")
+                print(f"Best Fitness (avg lines cleared): {best_fitness:.2f} "
+                      f"after {worker_totals['pieces']} pieces simulated, {now - start_time:.0f}s")
+                if TARGET_FITNESS is not None and not reached and best_fitness >= TARGET_FITNESS:
+                    reached = True
+                    print(f"Reached {TARGET_FITNESS} lines in steady state after {evaluated} "
+                          f"evaluations, {worker_totals['pieces']} pieces simulated")
+                print(f"Best Weights: {np.round(best_weights, 4)}")
+                print(utilization_report())
+                if PROFILE:
+                    print(phase_totals)
+                if TELEMETRY_FILE:
+                    write_telemetry(telemetry(evaluated // POPULATION_SIZE - 1, fitness_seconds,
+                                              window_totals, np.array([f for f, _ in scored]),
+                                              best_weights, now - start_time,
+                                              window_phases if PROFILE else None))
+                window_time = now
+                window_totals = dict(worker_totals)
+                window_phases = phase_totals.stats()
+                worker_busy.clear()
+                worker_pieces.clear()
+                game_lengths.clear()
+                if RESEED_GAMES and evaluated < evaluations:
+                    next_window()
+    finally:
+        for bank in banks.values():
+            os.remove(bank)
+    return sorted(scored, key=lambda entry: -entry[0])
+
+
+class GeneticOptimizer(object):
+    """
+    优化算法的接口: ask() 给出这一代要评估的权重, tell() 收回它们的适应度
+    (消行数, 越大越好), candidates() 是训练结束时要最后评估的权重。
+    这个是原来的遗传算法: 精英保留、轮盘赌选择、单点交叉和逐个基因变异。
+    """
+
+    def __init__(self) -> None:
+        self.population = initialize_population()
+
+    def ask(self) -> List[np.ndarray]:
+        return self.population
+
+    def tell(self, solutions: List[np.ndarray], fitness: np.ndarray) -> None:
+        self.population = selection(solutions, fitness)
+
+    def candidates(self) -> List[np.ndarray]:
+        return self.ask()
+
+
+class CMAESOptimizer(GeneticOptimizer):
+    """
+    CMA-ES (Hansen 的 (mu/mu_w, lambda) 版本): 每代从多元正态分布采样
+    POPULATION_SIZE 组权重, 用最好的一半更新均值、协方差矩阵和步长。
+    采样和更新都是对整代的矩阵运算。
+    """
+
+    def __init__(self) -> None:
+        n = NUM_WEIGHTS
+        self.popsize = POPULATION_SIZE
+        self.mu = self.popsize // 2
+        w = np.log(self.mu + 0.5) - np.log(np.arange(1, self.mu + 1))
+        self.weights = w / w.sum()
+        self.mueff = 1 / np.sum(self.weights ** 2)
+        self.cc = (4 + self.mueff / n) / (n + 4 + 2 * self.mueff / n)
+        self.cs = (self.mueff + 2) / (n + self.mueff + 5)
+        self.c1 = 2 / ((n + 1.3) ** 2 + self.mueff)
+        self.cmu = min(1 - self.c1,
+                       2 * (self.mueff - 2 + 1 / self.mueff) / ((n + 2) ** 2 + self.mueff))
+        self.damps = 1 + 2 * max(0, math.sqrt((self.mueff - 1) / (n + 1)) - 1) + self.cs
+        self.chi_n = math.sqrt(n) * (1 - 1 / (4 * n) + 1 / (21 * n ** 2))
+        self.mean = np.zeros(n)
+        self.sigma = CMA_SIGMA
+        self.C = np.eye(n)
+        self.pc = np.zeros(n)
+        self.ps = np.zeros(n)
+        self.generation = 0
+
+    def eigen(self) -> Tuple[np.ndarray, np.ndarray]:
+        """协方差矩阵的特征分解 C = B diag(D**2) B^T"""
+        eigenvalues, B = np.linalg.eigh(self.C)
+        return np.sqrt(np.maximum(eigenvalues, 1e-20)), B
+
+    def ask(self) -> List[np.ndarray]:
+        D, B = self.eigen()
+        z = np.random.standard_normal((self.popsize, len(self.mean)))
+        return list(self.mean + self.sigma * (z * D) @ B.T)
+
+    def tell(self, solutions: List[np.ndarray], fitness: np.ndarray) -> None:
+        n = len(self.mean)
+        best = np.argsort(-np.asarray(fitness), kind="stable")[:self.mu]
+        y = (np.asarray(solutions)[best] - self.mean) / self.sigma
+        y_w = self.weights @ y
+        self.mean = self.mean + self.sigma * y_w
+
+        D, B = self.eigen()
+        self.ps = ((1 - self.cs) * self.ps +
+                   math.sqrt(self.cs * (2 - self.cs) * self.mueff) * (B @ ((B.T @ y_w) / D)))
+        self.generation += 1
+        ps_norm = np.linalg.norm(self.ps)
+        hsig = (ps_norm / math.sqrt(1 - (1 - self.cs) ** (2 * self.generation)) / self.chi_n
+                < 1.4 + 2 / (n + 1))
+        self.pc = (1 - self.cc) * self.pc + hsig * math.sqrt(self.cc * (2 - self.cc) * self.mueff) * y_w
+        rank_mu = (y.T * self.weights) @ y
+        self.C = ((1 - self.c1 - self.cmu) * self.C +
+                  self.c1 * (np.outer(self.pc, self.pc) +
+                             (1 - hsig) * self.cc * (2 - self.cc) * self.C) +
+                  self.cmu * rank_mu)
+        self.sigma *= math.exp(self.cs / self.damps * (ps_norm / self.chi_n - 1))
+
+    def candidates(self) -> List[np.ndarray]:
+        return [self.mean.copy()] + self.ask()
+
+
+class CrossEntropyOptimizer(GeneticOptimizer):
+    """
+    交叉熵方法 (Szita & Lőrincz 用来学 Tetris 权重的带噪声版本):
+    每个权重独立正态分布, 每代用最好的 CEM_ELITE 比例重新估计均值和方差,
+    方差再加上 CEM_NOISE。
+    """
+
+    def __init__(self) -> None:
+        self.popsize = POPULATION_SIZE
+        self.mean = np.zeros(NUM_WEIGHTS)
+        self.std = np.ones(NUM_WEIGHTS)
+
+    def ask(self) -> List[np.ndarray]:
+        return list(self.mean + self.std * np.random.standard_normal((self.popsize, len(self.mean))))
+
+    def tell(self, solutions: List[np.ndarray], fitness: np.ndarray) -> None:
+        elite = max(1, int(CEM_ELITE * self.popsize))
+        best = np.asarray(solutions)[np.argsort(-np.asarray(fitness), kind="stable")[:elite]]
+        self.mean = best.mean(axis=0)
+        self.std = np.sqrt(best.var(axis=0) + CEM_NOISE)
+
+    def candidates(self) -> List[np.ndarray]:
+        return [self.mean.copy()] + self.ask()
+
+
+OPTIMIZERS = {"ga": GeneticOptimizer, "cmaes": CMAESOptimizer, "cem": CrossEntropyOptimizer}
+
 
-    population = initialize_population()
+def new_optimizer(name: str = None) -> GeneticOptimizer:
+    """按 OPTIMIZER (或 name) 创建优化算法"""
+    name = name or OPTIMIZER
+    if name not in OPTIMIZERS:
+        raise(Exception("unknown optimizer {}, choose from {}".format(
+            name, ", ".join(OPTIMIZERS))))
+    return OPTIMIZERS[name]()
 
+
+# --- 步骤三：主训练循环 ---
+
+
+def save_checkpoint(generation: int, optimizer: GeneticOptimizer, pieces: int = 0) -> None:
+    """第 generation 代开始前的优化算法状态 (种群或分布)、随机数状态和
+    已经模拟的方块数写进 CHECKPOINT_FILE，先写临时文件再改名，
+    中途退出也不会留下写了一半的存档"""
+    temp = CHECKPOINT_FILE + ".tmp"
+    with open(temp, "wb") as f:
+        pickle.dump({"generation": generation, "optimizer": optimizer, "pieces": pieces,
+                     "random": random.getstate(), "np_random": np.random.get_state()}, f)
+    os.replace(temp, CHECKPOINT_FILE)
+
+
+def load_checkpoint() -> Tuple[int, GeneticOptimizer, int]:
+    """读回 save_checkpoint() 的存档，恢复随机数状态，返回代数、优化算法和方块数"""
+    with open(CHECKPOINT_FILE, "rb") as f:
+        checkpoint = pickle.load(f)
+    random.setstate(checkpoint["random"])
+    np.random.set_state(checkpoint["np_random"])
+    return checkpoint["generation"], checkpoint["optimizer"], checkpoint["pieces"]
+
+
+def generations(optimizer: GeneticOptimizer, first_gen: int = 0,
+                total_pieces: int = 0) -> List[np.ndarray]:
+    """按代训练到 NUM_GENERATIONS 代，返回最后要评估的候选权重。
+    first_gen 和 total_pieces 是从存档接着训练时的代数和已经模拟的方块数"""
+    start = time.monotonic()
+    reached = False
     # 在循环外只创建一次进程池
-    with multiprocessing.Pool() as pool:
-        for gen in range(NUM_GENERATIONS):
+    with multiprocessing.Pool(WORKERS) as pool:
+        for gen in range(first_gen, NUM_GENERATIONS):
+            if CHECKPOINT_FILE:
+                save_checkpoint(gen, optimizer, total_pieces)
+            population = optimizer.ask()
             start_time = time.monotonic()
+            start_totals = dict(worker_totals)
+            start_phases = phase_totals.stats()
 
             print(f"\n--- Generation {gen + 1}/{NUM_GENERATIONS} ---")
 
             # 将 pool 传入函数中
-            fitness_scores = calculate_fitness_parallel(population, pool)
+            fitness_scores = calculate_fitness_parallel(population, pool, gen)
 
             best_fitness = np.max(fitness_scores)
             best_weights_idx = np.argmax(fitness_scores)
             best_weights = population[best_weights_idx]
 
-            population = selection(population, fitness_scores)
+            optimizer.tell(population, fitness_scores)
 
             end_time = time.monotonic()
             duration = end_time - start_time
 
-            print(f"Generation Time: {duration:.2f}s")
-            print(f"Best Fitness (avg lines cleared): {best_fitness:.2f}")
+            pieces = worker_totals["pieces"] - start_totals["pieces"]
+            total_pieces += pieces
+            print(f"Generation Time: {duration:.2f}s, "
+                  f"Pieces: {pieces} ({pieces / duration:.0f} pieces/s)")
+            print(f"Best Fitness (avg lines cleared): {best_fitness:.2f} "
+                  f"after {total_pieces} pieces simulated, {end_time - start:.0f}s")
+            if TARGET_FITNESS is not None and not reached and best_fitness >= TARGET_FITNESS:
+                reached = True
+                print(f"Reached {TARGET_FITNESS} lines with {OPTIMIZER} in generation {gen + 1}, "
+                      f"after {total_pieces} pieces simulated")
             print(f"Best Weights: {np.round(best_weights, 4)}")
+            print(utilization_report())
+            print(search_report())
+            if PROFILE:
+                print(phase_totals)
+            if SOLVE_CACHE_SIZE:
+                print(cache_report())
+            if fitness_cache is not None:
+                print(fitness_cache)
+            if TELEMETRY_FILE:
+                write_telemetry(telemetry(gen, duration, start_totals, fitness_scores,
+                                          best_weights, end_time - start,
+                                          start_phases if PROFILE else None))
+    return optimizer.candidates()
+
+
+def main(resume: bool = False) -> None:
+    global fitness_cache
+    # 设置多进程启动方式，兼容不同操作系统
+    try:
+        multiprocessing.set_start_method("fork", force=True)
+    except RuntimeError:
+        pass  # 'fork' might already be set
+
+    if COMMON_RANDOM_NUMBERS and (FITNESS_CACHE_FILE or not RESEED_GAMES):
+        fitness_cache = FitnessCache(FITNESS_CACHE_FILE)
+    if STEADY_STATE:
+        if resume:
+            raise(Exception("--resume is not supported with STEADY_STATE"))
+        with multiprocessing.Pool(WORKERS) as pool:
+            population = [weights for _, weights in steady_state(pool)]
+    else:
+        first_gen = 0
+        # 已经模拟的方块数, 用来比较各优化算法达到同样成绩要花多少计算
+        total_pieces = 0
+        if resume and CHECKPOINT_FILE and os.path.exists(CHECKPOINT_FILE):
+            # 中断的那一代已经玩完的局都在适应度缓存里，不会重玩
+            first_gen, optimizer, total_pieces = load_checkpoint()
+            print(f"Resuming at generation {first_gen + 1}")
+        else:
+            if resume:
+                print("No checkpoint found, starting from scratch")
+            optimizer = new_optimizer()
+        population = generations(optimizer, first_gen, total_pieces)
 
     print("\n--- Training Finished ---")
     # 最终找到的最优权重
     # 在这里也需要一个临时的pool来完成最后一次评估
-    with multiprocessing.Pool() as pool:
-        final_fitness = calculate_fitness_parallel(population, pool)
+    with multiprocessing.Pool(WORKERS) as pool:
+        # 最后一次不淘汰, 每个个体都玩满
+        final_fitness = calculate_fitness_parallel(population, pool, NUM_GENERATIONS,
+                                                   racing=False, proxy=False)
         final_best_idx = np.argmax(final_fitness)
         final_best_weights = population[final_best_idx]
         print(f"Final best weights found: {final_best_weights}")
+        weights = ",".join(repr(w) for w in final_best_weights.tolist())
+        print(f"Play them with: python3 tetris.py -a --weights={weights}")
+    if SOLVE_CACHE_SIZE:
+        print(cache_report())
 
 
 if __name__ == "__main__":
@@ -294,4 +1105,24 @@ if __name__ == "__main__":
         print("Error: numpy is not installed. Please run 'pip install numpy'")
         exit()
 
-    main()
\ No newline at end of file
+    # python3 train.py [--checkpoint | --resume] [--optimizer=ga|cmaes|cem] [--target=lines]
+    #                  [--telemetry=file.jsonl|file.csv] [--steady] [--profile]
+    opts, args = getopt.getopt(sys.argv[1:], 'r', ['resume', 'checkpoint', 'optimizer=',
+                                                   'target=', 'telemetry=', 'steady',
+                                                   'profile'])
+    for opt_name, opt_value in opts:
+        if opt_name in ('-r', '--resume', '--checkpoint'):
+            # 接着训练时继续保存, 以后还能再接着
+            CHECKPOINT_FILE = CHECKPOINT_FILE or "train_checkpoint.pkl"
+            FITNESS_CACHE_FILE = FITNESS_CACHE_FILE or "fitness_cache.jsonl"
+        if opt_name == '--optimizer':
+            OPTIMIZER = opt_value
+        if opt_name == '--target':
+            TARGET_FITNESS = float(opt_value)
+        if opt_name == '--telemetry':
+            TELEMETRY_FILE = opt_value
+        if opt_name == '--steady':
+            STEADY_STATE = True
+        if opt_name == '--profile':
+            PROFILE = True
+    main(resume=any(opt_name in ('-r', '--resume') for opt_name, _ in opts))
\ No newline at end of file